@@ -2,11 +2,27 @@
 """
 Check which listing professors are NOT in faculty_complete.json.
 Reads MONGODBURL_MIGRATION from server/.env and compares against the faculty JSON.
+
+Listings are streamed from a cursor and each miss is reported as soon as it is
+found; --output also writes them to a .jsonl or .csv file as the check runs.
+--since limits the check to listings updated after a timestamp, or after the
+last completed run with --since last.
+--timings prints where the run spent its time (loading faculty, waiting on
+MongoDB, matching, reporting) and the slowest listings to match; --profile
+writes a cProfile dump of the whole run.
 """
 
+import argparse
+import csv
+import heapq
 import json
 import os
 import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from difflib import SequenceMatcher
 from urllib.parse import quote_plus
 
 try:
@@ -27,42 +43,282 @@ def load_env():
                 env_vars[key.strip()] = val.strip()
     return env_vars
 
+STATE_PATH = os.path.join(os.path.dirname(__file__), ".checker_state.json")
+
+def parse_since(value):
+    """ISO timestamp (naive means UTC), or "last" for the previous completed run."""
+    if value == "last":
+        try:
+            with open(STATE_PATH) as f:
+                value = json.load(f)["last_run"]
+        except (OSError, ValueError, KeyError):
+            print("[WARN] No previous run recorded; checking every listing")
+            return None
+    since = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return since if since.tzinfo else since.replace(tzinfo=timezone.utc)
+
+def save_last_run(started):
+    with open(STATE_PATH, "w") as f:
+        json.dump({"last_run": started.isoformat()}, f)
+
+class MissingWriter:
+    """Appends each listing with missing or fuzzily matched professors to a .jsonl or .csv file."""
+
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.csv = None
+        if path.endswith(".csv"):
+            self.csv = csv.writer(self.file)
+            self.csv.writerow(["listing_id", "title", "reasons", "fuzzy_matches"])
+
+    def write(self, listing_id, title, reasons, fuzzy):
+        if self.csv:
+            self.csv.writerow([listing_id, title, "; ".join(reasons), "; ".join(fuzzy)])
+        else:
+            record = {"listing_id": listing_id, "title": title, "reasons": reasons, "fuzzy_matches": fuzzy}
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
 def normalize(name):
     """Lowercase, strip whitespace and punctuation for fuzzy matching."""
     return name.strip().lower().replace(".", "").replace("-", " ")
 
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def first_name_score(query, candidate):
+    """How well a listing's first name matches a faculty first name (0-1)."""
+    if query == candidate:
+        return 1.0
+    if min(len(query), len(candidate)) >= 2 and (candidate.startswith(query) or query.startswith(candidate)):
+        return 0.9  # Jon / Jonathan
+    if (len(query) == 1 or len(candidate) == 1) and query[0] == candidate[0]:
+        return 0.8  # J / Jonathan
+    return SequenceMatcher(None, query, candidate).ratio()
+
+class FacultyIndex:
+    """Exact and fuzzy lookups of listing names against faculty_complete.json.
+
+    Exact normalized names and emails are set lookups. Anything else is scored
+    against the faculty sharing its last name, or, when no one does, against
+    last names sharing most trigrams with it (so "Smyth" still finds
+    "Smith"), which keeps the work per listing independent of faculty size.
+    """
+
+    MAX_BLOCKED_LASTNAMES = 5
+
+    def __init__(self, faculty):
+        # Key by normalized "fname lname", "known_as lname", and email
+        self.names = set()
+        self.emails = set()
+        self.by_lastname = defaultdict(list)  # lname -> [(first names, display name)]
+        self.lastnames_by_trigram = defaultdict(set)
+
+        for record in faculty:
+            fname = record.get("fname", "").strip()
+            lname = record.get("lname", "").strip()
+            known_as = record.get("known_as", "").strip()
+            email = record.get("email", "").strip().lower()
+
+            if fname and lname:
+                self.names.add(normalize(f"{fname} {lname}"))
+            if known_as and lname:
+                self.names.add(normalize(f"{known_as} {lname}"))
+            if email:
+                self.emails.add(email)
+            if lname:
+                last = " ".join(normalize(lname).split())
+                # A placeholder first name ("-") normalizes to nothing; leave it out
+                firsts = {" ".join(normalize(n).split()) for n in (fname, known_as)} - {""}
+                shown = next((n for n in (fname, known_as) if normalize(n).strip()), "")
+                self.by_lastname[last].append((firsts, f"{shown} {lname}".strip()))
+                for gram in trigrams(last):
+                    self.lastnames_by_trigram[gram].add(last)
+
+    def candidate_lastnames(self, last):
+        if last in self.by_lastname:
+            return [(last, 1.0)]
+        grams = trigrams(last)
+        shared = defaultdict(int)
+        for gram in grams:
+            for candidate in self.lastnames_by_trigram.get(gram, ()):
+                shared[candidate] += 1
+        # Dice coefficient over trigrams picks the few last names worth scoring
+        blocked = sorted(
+            ((2 * count / (len(grams) + len(trigrams(candidate))), candidate)
+             for candidate, count in shared.items()),
+            reverse=True,
+        )[:self.MAX_BLOCKED_LASTNAMES]
+        return [(candidate, SequenceMatcher(None, last, candidate).ratio())
+                for dice, candidate in blocked if dice >= 0.5]
+
+    def match(self, name):
+        """(display name of the best faculty match or None, confidence 0-1)."""
+        norm = normalize(name)
+        tokens = norm.split()
+        if norm in self.names or " ".join(tokens) in self.names:
+            return name, 1.0
+        if len(tokens) < 2:
+            return None, 0.0
+
+        scores = {}
+        # Try one-, two- and three-word last names ("de la cruz")
+        for width in range(1, min(3, len(tokens) - 1) + 1):
+            last = " ".join(tokens[-width:])
+            # Middle initials say little; compare the given name(s) only
+            given = [t for i, t in enumerate(tokens[:-width]) if i == 0 or len(t) > 1]
+            for candidate, last_score in self.candidate_lastnames(last):
+                for firsts, display in self.by_lastname[candidate]:
+                    first_score = max(
+                        (max(first_name_score(given[0], first.split()[0]),
+                             first_name_score(" ".join(given), first))
+                         for first in firsts),
+                        default=0.0,
+                    )
+                    confidence = round(0.55 * last_score + 0.45 * first_score, 2)
+                    scores[display] = max(confidence, scores.get(display, 0.0))
+        if not scores:
+            return None, 0.0
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        display, confidence = ranked[0]
+        # "J. Smith" with both a John and a Jonathan Smith on file is a guess
+        if len(ranked) > 1 and confidence - ranked[1][1] < 0.05:
+            confidence = round(confidence - 0.1, 2)
+        return display, confidence
+
+class Timings:
+    """Seconds spent per phase of the run, plus the listings slowest to match."""
+
+    def __init__(self, slowest=5):
+        self.seconds = defaultdict(float)
+        self.slowest = []  # min-heap of (seconds, title)
+        self.keep = slowest
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - started
+
+    def iterate(self, name, iterable):
+        """Yield from iterable, charging the wait for each item to `name`."""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def listing(self, seconds, title):
+        if len(self.slowest) < self.keep:
+            heapq.heappush(self.slowest, (seconds, title))
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, title))
+
+    def print(self, checked):
+        total = sum(self.seconds.values())
+        print("\nTimings:")
+        for name, seconds in self.seconds.items():
+            share = seconds / total * 100 if total else 0
+            print(f"  {name:<14} {seconds:8.3f}s  {share:5.1f}%")
+        if checked:
+            print(f"  {self.seconds['match'] / checked * 1e6:.0f} us per listing matched")
+        for seconds, title in sorted(self.slowest, reverse=True):
+            print(f"  slow: {seconds * 1000:7.2f} ms  {title}")
+
+def describe(name, match, confidence, min_confidence):
+    """The name, plus its best faculty candidate and how far it fell short of the threshold."""
+    if not match or confidence < 0.5:
+        return name
+    return f"{name} (best candidate: {match}, {confidence:.2f} < {min_confidence:.2f} required)"
+
+def check_listing(listing, index, min_confidence):
+    """(reasons this listing is not covered by the faculty data, fuzzy matches accepted)."""
+    owner_first = listing.get("ownerFirstName", "").strip()
+    owner_last = listing.get("ownerLastName", "").strip()
+    owner_email = (listing.get("ownerEmail") or "").strip().lower()
+    prof_names = listing.get("professorNames", [])
+    emails = [e.strip().lower() for e in listing.get("emails", []) if e]
+
+    reasons = []
+    fuzzy = []
+
+    # Check owner
+    if not (owner_email and owner_email in index.emails):
+        owner = f"{owner_first} {owner_last}"
+        match, confidence = index.match(owner) if owner_first and owner_last else (None, 0.0)
+        if confidence < min_confidence:
+            reasons.append(f"owner: {describe(owner, match, confidence, min_confidence)} ({owner_email})")
+        elif confidence < 1.0:
+            fuzzy.append(f"owner: {owner} ~ {match} ({confidence:.2f})")
+
+    # Check all professors
+    found_by_email = any(e in index.emails for e in emails)
+    for pname in prof_names:
+        match, confidence = index.match(pname)
+        if confidence >= 1.0:
+            continue
+        # Try matching by last name + email
+        if found_by_email:
+            continue
+        if confidence >= min_confidence:
+            fuzzy.append(f"prof: {pname} ~ {match} ({confidence:.2f})")
+        else:
+            reasons.append(f"prof: {describe(pname, match, confidence, min_confidence)}")
+
+    return reasons, fuzzy
+
 def main():
+    parser = argparse.ArgumentParser(description="Report listings whose professors are not in faculty_complete.json.")
+    parser.add_argument("--output", help="also write misses to this .jsonl or .csv file as they are found")
+    parser.add_argument("--since", help='only check listings updated after this ISO timestamp, or "last"')
+    parser.add_argument("--updated-field", default="updatedAt", help="listing field --since compares against")
+    parser.add_argument("--batch-size", type=int, default=500, help="listings fetched per cursor batch")
+    parser.add_argument("--min-confidence", type=float, default=1.0,
+                        help="accept fuzzy name matches scoring at least this; the default only "
+                             "accepts exact matches and lists the closest candidate with each miss")
+    parser.add_argument("--timings", action="store_true",
+                        help="print time per phase and the slowest listings to match")
+    parser.add_argument("--profile", metavar="PATH", help="write a cProfile dump of the run to PATH")
+    args = parser.parse_args()
+    args.batch_size = max(1, args.batch_size)
+
+    if not args.profile:
+        return run(args)
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(run, args)
+    finally:
+        profiler.dump_stats(args.profile)
+        print(f"Profile written to {args.profile}")
+
+def run(args):
+    started = datetime.now(timezone.utc)
+    timings = Timings()
+    since = parse_since(args.since) if args.since else None
+
     # Load faculty_complete.json
     faculty_path = os.path.join(os.path.dirname(__file__), "..", "web-scraper", "faculty_complete.json")
     if not os.path.exists(faculty_path):
         print(f"[ERROR] Not found: {faculty_path}")
         sys.exit(1)
 
-    with open(faculty_path, "r", encoding="utf-8") as f:
+    with timings.phase("load faculty"), open(faculty_path, "r", encoding="utf-8") as f:
         faculty = json.load(f)
-
-    # Build lookup sets from faculty data
-    # Key by normalized "fname lname", "known_as lname", and email
-    faculty_names = set()
-    faculty_emails = set()
-    faculty_lastnames = set()
-
-    for record in faculty:
-        fname = record.get("fname", "").strip()
-        lname = record.get("lname", "").strip()
-        known_as = record.get("known_as", "").strip()
-        email = record.get("email", "").strip().lower()
-
-        if fname and lname:
-            faculty_names.add(normalize(f"{fname} {lname}"))
-        if known_as and lname:
-            faculty_names.add(normalize(f"{known_as} {lname}"))
-        if email:
-            faculty_emails.add(email)
-        if lname:
-            faculty_lastnames.add(normalize(lname))
-
-    print(f"Loaded {len(faculty)} faculty records ({len(faculty_names)} unique names)")
+        index = FacultyIndex(faculty)
+    print(f"Loaded {len(faculty)} faculty records ({len(index.names)} unique names)")
 
     # Connect to ProductionMigration
     env = load_env()
@@ -75,65 +331,61 @@ def main():
     db_name = mongo_url.rsplit("/", 1)[-1].split("?")[0]
     db = client[db_name]
 
-    listings = list(db["listings"].find({}, {
-        "title": 1,
-        "ownerFirstName": 1,
-        "ownerLastName": 1,
-        "ownerEmail": 1,
-        "professorNames": 1,
-        "emails": 1,
-    }))
-    print(f"Loaded {len(listings)} listings from ProductionMigration\n")
-
-    # Check each listing
-    missing = []
-    for listing in listings:
-        title = listing.get("title", "(no title)")
-        owner_first = listing.get("ownerFirstName", "").strip()
-        owner_last = listing.get("ownerLastName", "").strip()
-        owner_email = (listing.get("ownerEmail") or "").strip().lower()
-        prof_names = listing.get("professorNames", [])
-        emails = [e.strip().lower() for e in listing.get("emails", []) if e]
-
-        # Check owner
-        owner_found = False
-        if owner_email and owner_email in faculty_emails:
-            owner_found = True
-        elif owner_first and owner_last:
-            owner_found = normalize(f"{owner_first} {owner_last}") in faculty_names
-
-        # Check all professors
-        profs_not_found = []
-        for pname in prof_names:
-            pname_norm = normalize(pname)
-            if pname_norm in faculty_names:
-                continue
-            # Try matching by last name + email
-            found_by_email = any(e in faculty_emails for e in emails)
-            if found_by_email:
-                continue
-            profs_not_found.append(pname)
-
-        if not owner_found or profs_not_found:
-            reasons = []
-            if not owner_found:
-                reasons.append(f"owner: {owner_first} {owner_last} ({owner_email})")
-            for p in profs_not_found:
-                reasons.append(f"prof: {p}")
-            missing.append((title, reasons))
+    query = {}
+    if since:
+        query[args.updated_field] = {"$gt": since}
+        print(f"Checking listings with {args.updated_field} after {since.isoformat()}")
+
+    writer = MissingWriter(args.output) if args.output else None
+    checked = 0
+    missing = 0
+    fuzzy_matches = 0
+    try:
+        with db["listings"].find(query, {
+            "title": 1,
+            "ownerFirstName": 1,
+            "ownerLastName": 1,
+            "ownerEmail": 1,
+            "professorNames": 1,
+            "emails": 1,
+        }, batch_size=args.batch_size) as cursor:
+            for listing in timings.iterate("mongo", cursor):
+                checked += 1
+                matched = time.perf_counter()
+                reasons, fuzzy = check_listing(listing, index, args.min_confidence)
+                elapsed = time.perf_counter() - matched
+                timings.seconds["match"] += elapsed
+                timings.listing(elapsed, listing.get("title", "(no title)"))
+                fuzzy_matches += len(fuzzy)
+                if reasons:
+                    missing += 1
+                with timings.phase("report"):
+                    if reasons or fuzzy:
+                        title = listing.get("title", "(no title)")
+                        print(f"  {title}")
+                        for r in reasons:
+                            print(f"    - {r}")
+                        for m in fuzzy:
+                            print(f"    ~ {m}")
+                        if writer:
+                            writer.write(str(listing["_id"]), title, reasons, fuzzy)
+                    if writer and checked % args.batch_size == 0:
+                        writer.flush()
+    finally:
+        if writer:
+            writer.close()
+        client.close()
 
     # Print results
+    if fuzzy_matches:
+        print(f"\n{fuzzy_matches} names accepted as fuzzy matches (confidence >= {args.min_confidence})")
     if missing:
-        print(f"=== {len(missing)} listings with professors NOT in faculty_complete.json ===\n")
-        for title, reasons in sorted(missing, key=lambda x: x[0]):
-            print(f"  {title}")
-            for r in reasons:
-                print(f"    - {r}")
-        print(f"\nTotal: {len(missing)} / {len(listings)} listings")
+        print(f"\nTotal: {missing} / {checked} listings with professors NOT in faculty_complete.json")
     else:
-        print("All listing professors found in faculty_complete.json!")
-
-    client.close()
+        print(f"All listing professors found in faculty_complete.json! ({checked} listings checked)")
+    if args.timings:
+        timings.print(checked)
+    save_last_run(started)
 
 if __name__ == "__main__":
     main()
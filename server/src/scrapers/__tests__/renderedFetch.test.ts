@@ -1,11 +1,16 @@
+import { EventEmitter } from 'node:events';
+import { PassThrough } from 'node:stream';
+import { gzipSync } from 'node:zlib';
 import { describe, expect, it, vi } from 'vitest';
 
 const mocks = vi.hoisted(() => ({
   execFile: vi.fn(),
+  spawn: vi.fn(),
 }));
 
 vi.mock('node:child_process', () => ({
   execFile: mocks.execFile,
+  spawn: mocks.spawn,
 }));
 
 import { createScraplingRenderedFetcher } from '../renderedFetch';
@@ -18,6 +23,29 @@ const execFileSuccess = (payload: unknown) => {
 
 const noSeedRedirect = async () => false;
 
+const fakeBridgeChild = (
+  respond: (request: Record<string, unknown>) => Record<string, unknown> | undefined,
+) => {
+  const child = Object.assign(new EventEmitter(), {
+    stdin: new PassThrough(),
+    stdout: new PassThrough(),
+    kill: vi.fn(),
+    unref: vi.fn(),
+  });
+  const requests: Record<string, unknown>[] = [];
+  child.stdin.setEncoding('utf8');
+  child.stdin.on('data', (chunk: string) => {
+    for (const line of chunk.split('\n').filter(Boolean)) {
+      const request = JSON.parse(line) as Record<string, unknown>;
+      requests.push(request);
+      const response = respond(request);
+      if (response) child.stdout.write(`${JSON.stringify({ id: request.id, ...response })}\n`);
+    }
+  });
+  mocks.spawn.mockReturnValueOnce(child);
+  return { child, requests };
+};
+
 describe('createScraplingRenderedFetcher', () => {
   it('blocks before invoking the Python renderer when the seed URL redirects', async () => {
     const fetcher = createScraplingRenderedFetcher({
@@ -112,6 +140,98 @@ describe('createScraplingRenderedFetcher', () => {
     });
   });
 
+  it('requests size-capped gzip html and decodes it', async () => {
+    execFileSuccess({
+      url: 'https://8.8.8.8/source',
+      statusCode: 200,
+      html: '',
+      htmlTransport: 'gzip',
+      htmlData: gzipSync('<html>compressed content</html>').toString('base64'),
+      htmlTruncated: true,
+    });
+    const fetcher = createScraplingRenderedFetcher({
+      enabled: true,
+      pythonCommand: 'python3',
+      bridgePath: 'scraplingBridge.py',
+      seedRedirectCheck: noSeedRedirect,
+    });
+
+    const result = await fetcher?.({ url: 'https://8.8.8.8/source' });
+
+    expect(mocks.execFile).toHaveBeenLastCalledWith(
+      'python3',
+      expect.arrayContaining([
+        '--html-transport',
+        'gzip',
+        '--max-html-bytes',
+        String(8 * 1024 * 1024),
+      ]),
+      expect.any(Object),
+      expect.any(Function),
+    );
+    expect(result).toMatchObject({
+      url: 'https://8.8.8.8/source',
+      html: '<html>compressed content</html>',
+      htmlTruncated: true,
+    });
+  });
+
+  it('passes known render profiles to the bridge and drops unknown ones', async () => {
+    execFileSuccess({ url: 'https://8.8.8.8/source', statusCode: 200, html: '<html></html>' });
+    execFileSuccess({ url: 'https://8.8.8.8/source', statusCode: 200, html: '<html></html>' });
+    const fetcher = createScraplingRenderedFetcher({
+      enabled: true,
+      pythonCommand: 'python3',
+      bridgePath: 'scraplingBridge.py',
+      seedRedirectCheck: noSeedRedirect,
+    });
+
+    await fetcher?.({ url: 'https://8.8.8.8/source', profile: 'directory-listing' });
+    expect(mocks.execFile).toHaveBeenLastCalledWith(
+      'python3',
+      expect.arrayContaining(['--profile', 'directory-listing']),
+      expect.any(Object),
+      expect.any(Function),
+    );
+
+    await fetcher?.({ url: 'https://8.8.8.8/source', profile: 'unknown --flag' });
+    expect(mocks.execFile.mock.calls.at(-1)?.[1]).not.toContain('--profile');
+  });
+
+  it('requests selector fragments instead of the whole document when extract is set', async () => {
+    mocks.spawn.mockReset();
+    const { requests } = fakeBridgeChild(() => ({
+      url: 'https://8.8.8.8/people',
+      statusCode: 200,
+      html: '',
+      fragments: {
+        table: [{ html: '<table><tr><td>Ada</td></tr></table>', text: 'Ada' }],
+        bio: [],
+      },
+    }));
+    const fetcher = createScraplingRenderedFetcher({
+      enabled: true,
+      pythonCommand: 'python3',
+      bridgePath: 'scraplingBridge.py',
+      persistent: true,
+      seedRedirectCheck: noSeedRedirect,
+    });
+
+    const result = await fetcher?.({
+      url: 'https://8.8.8.8/people',
+      extract: { table: 'table.people', bio: 'div.bio', 'bad name': 'p', empty: ' ' },
+    });
+
+    expect(requests[0]).toMatchObject({ extract: { table: 'table.people', bio: 'div.bio' } });
+    expect(result).toMatchObject({
+      html: '<table><tr><td>Ada</td></tr></table>',
+      fragments: {
+        table: [{ html: '<table><tr><td>Ada</td></tr></table>', text: 'Ada' }],
+        bio: [],
+      },
+    });
+  });
+
   it('bounds rendered fetch child-process timeouts', async () => {
     execFileSuccess({
       url: 'https://8.8.8.8/source',
@@ -159,4 +279,119 @@ describe('createScraplingRenderedFetcher', () => {
       expect.any(Function),
     );
   });
+
+  it('reuses one serving bridge process across persistent rendered fetches', async () => {
+    mocks.spawn.mockReset();
+    const { requests } = fakeBridgeChild((request) => ({
+      url: request.url,
+      statusCode: 200,
+      html: `<html>${String(request.url)}</html>`,
+    }));
+    const fetcher = createScraplingRenderedFetcher({
+      enabled: true,
+      pythonCommand: 'python3',
+      bridgePath: 'scraplingBridge.py',
+      persistent: true,
+      seedRedirectCheck: noSeedRedirect,
+    });
+
+    const first = await fetcher?.({ url: 'https://8.8.8.8/one', waitSelector: 'main' });
+    const second = await fetcher?.({ url: 'https://8.8.8.8/two', mode: 'stealthy' });
+
+    expect(mocks.spawn).toHaveBeenCalledTimes(1);
+    expect(mocks.spawn).toHaveBeenCalledWith(
+      'python3',
+      [expect.stringMatching(/scraplingBridge\.py$/), '--serve', '--concurrency', '1'],
+      expect.objectContaining({ shell: false }),
+    );
+    expect(requests).toEqual([
+      {
+        id: 1,
+        url: 'https://8.8.8.8/one',
+        mode: 'dynamic',
+        timeoutMs: 30000,
+        waitSelector: 'main',
+        htmlTransport: 'gzip',
+        maxHtmlBytes: 8 * 1024 * 1024,
+      },
+      {
+        id: 2,
+        url: 'https://8.8.8.8/two',
+        mode: 'stealthy',
+        timeoutMs: 30000,
+        htmlTransport: 'gzip',
+        maxHtmlBytes: 8 * 1024 * 1024,
+      },
+    ]);
+    expect(first).toMatchObject({
+      url: 'https://8.8.8.8/one',
+      html: '<html>https://8.8.8.8/one</html>',
+    });
+    expect(second).toMatchObject({
+      url: 'https://8.8.8.8/two',
+      html: '<html>https://8.8.8.8/two</html>',
+    });
+  });
+
+  it('respawns the serving bridge after it exits mid-request', async () => {
+    mocks.spawn.mockReset();
+    const { child } = fakeBridgeChild(() => undefined);
+    child.stdin.removeAllListeners('data');
+    child.stdin.once('data', () => child.emit('exit', 1, null));
+    fakeBridgeChild((request) => ({ url: request.url, statusCode: 200, html: '<html>ok</html>' }));
+    const fetcher = createScraplingRenderedFetcher({
+      enabled: true,
+      pythonCommand: 'python3',
+      bridgePath: 'scraplingBridge.py',
+      persistent: true,
+      seedRedirectCheck: noSeedRedirect,
+    });
+
+    const failed = await fetcher?.({ url: 'https://8.8.8.8/crash' });
+    const recovered = await fetcher?.({ url: 'https://8.8.8.8/ok' });
+
+    expect(failed).toMatchObject({ html: '', blocked: false, fetchMode: 'scrapling' });
+    expect(failed?.blockedReason).toContain('exited');
+    expect(mocks.spawn).toHaveBeenCalledTimes(2);
+    expect(recovered).toMatchObject({ url: 'https://8.8.8.8/ok', html: '<html>ok</html>' });
+  });
+
+  it('matches out-of-order bridge responses to concurrent requests by id', async () => {
+    mocks.spawn.mockReset();
+    const held: Record<string, unknown>[] = [];
+    const { child, requests } = fakeBridgeChild((request) => {
+      held.push(request);
+      if (held.length < 3) return undefined;
+      // Answer in reverse order once the whole pool is busy.
+      for (const pending of [...held].reverse()) {
+        const response = { id: pending.id, url: pending.url, html: `<p>${String(pending.url)}</p>` };
+        child.stdout.write(`${JSON.stringify(response)}\n`);
+      }
+      return undefined;
+    });
+    const fetcher = createScraplingRenderedFetcher({
+      enabled: true,
+      pythonCommand: 'python3',
+      bridgePath: 'scraplingBridge.py',
+      persistent: true,
+      concurrency: 3,
+      seedRedirectCheck: noSeedRedirect,
+    });
+
+    const results = await Promise.all(
+      ['a', 'b', 'c'].map((path) => fetcher?.({ url: `https://8.8.8.8/${path}` })),
+    );
+
+    expect(mocks.spawn).toHaveBeenCalledWith(
+      'python3',
+      expect.arrayContaining(['--serve', '--concurrency', '3']),
+      expect.any(Object),
+    );
+    expect(requests.map((request) => request.id)).toEqual([1, 2, 3]);
+    expect(results.map((result) => result?.html)).toEqual([
+      '<p>https://8.8.8.8/a</p>',
+      '<p>https://8.8.8.8/b</p>',
+      '<p>https://8.8.8.8/c</p>',
+    ]);
+  });
 });
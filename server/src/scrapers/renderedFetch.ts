@@ -1,9 +1,10 @@
-import { execFile } from 'node:child_process';
+import { execFile, spawn, type ChildProcess } from 'node:child_process';
 import http from 'node:http';
 import https from 'node:https';
 import { basename, dirname, isAbsolute, join, resolve } from 'node:path';
 import { fileURLToPath } from 'node:url';
 import { promisify } from 'node:util';
+import { gunzipSync } from 'node:zlib';
 import { assertPublicHttpUrl, SsrfBlockedError, ssrfSafeAgents } from './../utils/ssrfGuard';
 import { sanitizeLogValue } from '../utils/logSanitizer';
 import type {
@@ -25,8 +26,25 @@ const DEFAULT_BRIDGE_PATH = join(
 const SCRAPER_DIR = dirname(fileURLToPath(import.meta.url));
 const PYTHON_COMMAND_RE = /^python(?:3(?:\.\d{1,2})?)?$/;
 const RENDERED_FETCH_MODES = new Set(['dynamic', 'stealthy']);
+// Mirrors RENDER_PROFILES in scraplingBridge.py.
+const RENDERED_FETCH_PROFILES = new Set([
+  'default',
+  'directory-listing',
+  'profile-page',
+  'spa-heavy',
+]);
 const MAX_RENDERED_FETCH_SELECTOR_LENGTH = 256;
+const MAX_RENDERED_FETCH_EXTRACT_NAMES = 16;
+const RENDERED_FETCH_EXTRACT_NAME_RE = /^[A-Za-z_][\w-]{0,63}$/;
 const MAX_RENDERED_SEED_REDIRECT_CHECK_MS = 5_000;
+const RENDERED_FETCH_GRACE_MS = 5_000;
+const RENDERED_FETCH_MAX_BUFFER_BYTES = 10 * 1024 * 1024;
+// Body bytes the bridge may return before truncating; gzip keeps the pipe payload well under
+// RENDERED_FETCH_MAX_BUFFER_BYTES, and re-encoding to UTF-8 can at most triple a legacy charset.
+const RENDERED_FETCH_MAX_HTML_BYTES = 8 * 1024 * 1024;
+const RENDERED_FETCH_MAX_DECODED_HTML_BYTES = 3 * RENDERED_FETCH_MAX_HTML_BYTES;
+const BRIDGE_WORKER_IDLE_MS = 60_000;
+const MAX_BRIDGE_WORKER_CONCURRENCY = 8;
 
 const normalizeRenderedPythonCommand = (value: string): string => {
   const command = value.trim();
@@ -56,12 +74,47 @@ const normalizeRenderedFetchMode = (value: unknown): 'dynamic' | 'stealthy' => {
     : 'dynamic';
 };
 
+const normalizeRenderedFetchProfile = (value: unknown): string | undefined =>
+  typeof value === 'string' && RENDERED_FETCH_PROFILES.has(value) ? value : undefined;
+
 const normalizeRenderedFetchSelector = (value: unknown): string | undefined => {
   if (typeof value !== 'string') return undefined;
   const selector = value.trim();
   return selector.length > 0 && selector.length <= MAX_RENDERED_FETCH_SELECTOR_LENGTH ? selector : undefined;
 };
 
+const normalizeRenderedFetchExtract = (
+  value: unknown,
+): Record<string, string> | undefined => {
+  if (!value || typeof value !== 'object' || Array.isArray(value)) return undefined;
+  const extract: Record<string, string> = {};
+  for (const [name, rawSelector] of Object.entries(value as Record<string, unknown>)) {
+    const selector = normalizeRenderedFetchSelector(rawSelector);
+    if (!RENDERED_FETCH_EXTRACT_NAME_RE.test(name) || !selector) continue;
+    extract[name] = selector;
+    if (Object.keys(extract).length >= MAX_RENDERED_FETCH_EXTRACT_NAMES) break;
+  }
+  return Object.keys(extract).length > 0 ? extract : undefined;
+};
+
+const renderedBridgeFragments = (
+  value: unknown,
+  extract: Record<string, string>,
+): Record<string, RenderedFetchFragment[]> => {
+  const raw = value && typeof value === 'object' ? (value as Record<string, unknown>) : {};
+  const fragments: Record<string, RenderedFetchFragment[]> = {};
+  for (const name of Object.keys(extract)) {
+    const matches = Array.isArray(raw[name]) ? (raw[name] as unknown[]) : [];
+    fragments[name] = matches.flatMap((match) => {
+      const fragment = match as Partial<RenderedFetchFragment> | null;
+      return fragment && typeof fragment.html === 'string'
+        ? [{ html: fragment.html, text: typeof fragment.text === 'string' ? fragment.text : '' }]
+        : [];
+    });
+  }
+  return fragments;
+};
+
 export interface RenderedFetchMetricOverrides {
   blocked?: boolean;
   blockedReason?: string;
@@ -73,6 +126,20 @@ export interface RenderedFetchRequest {
   waitSelector?: string;
   timeoutMs?: number;
   mode?: string;
+  /** Bridge render budget: blocked resources/hosts, idle-vs-selector wait, and time cap. */
+  profile?: string;
+  /**
+   * Named CSS selectors evaluated inside the rendered page. When set, the bridge returns only
+   * the matched elements as `fragments` instead of shipping the whole document.
+   */
+  extract?: Record<string, string>;
+}
+
+export interface RenderedFetchFragment {
+  /** Outer HTML of the matched element. */
+  html: string;
+  /** Its text content. */
+  text: string;
 }
 
 export interface RenderedFetchResult {
@@ -81,6 +148,13 @@ export interface RenderedFetchResult {
   statusCode?: number;
   blocked?: boolean;
   blockedReason?: string;
+  /** The bridge cut the page body at its byte cap. */
+  htmlTruncated?: boolean;
+  /**
+   * Matches per `extract` name, in document order. `html` is then every fragment's HTML
+   * concatenated, so callers that parse `html` keep working on the smaller document.
+   */
+  fragments?: Record<string, RenderedFetchFragment[]>;
   fetchMode?: ScraperFetchMode;
 }
 
@@ -94,9 +168,198 @@ export interface ScraplingRenderedFetcherOptions {
   bridgePath?: string;
   mode?: 'dynamic' | 'stealthy';
   timeoutMs?: number;
+  /**
+   * Keep one `scraplingBridge.py --serve` process (and its warm browser) alive across
+   * fetches instead of paying interpreter start, import and browser launch per URL.
+   */
+  persistent?: boolean;
+  /** Pages the persistent bridge renders at once from one browser (1-8). */
+  concurrency?: number;
   seedRedirectCheck?: (url: URL, timeoutMs: number) => Promise<boolean>;
 }
 
+interface PendingBridgeRequest {
+  resolve: (response: RenderedBridgeResponse) => void;
+  reject: (error: Error) => void;
+  timer: ReturnType<typeof setTimeout>;
+}
+
+interface RenderedBridgeResponse {
+  id?: number;
+  url?: string;
+  html?: string;
+  htmlTransport?: string;
+  htmlData?: string;
+  htmlTruncated?: boolean;
+  fragments?: unknown;
+  statusCode?: number;
+  blocked?: boolean;
+  blockedReason?: string;
+}
+
+const renderedBridgeHtml = (response: RenderedBridgeResponse): string => {
+  if (response.htmlTransport === 'gzip' && typeof response.htmlData === 'string') {
+    return gunzipSync(Buffer.from(response.htmlData, 'base64'), {
+      maxOutputLength: RENDERED_FETCH_MAX_DECODED_HTML_BYTES,
+    }).toString('utf8');
+  }
+  return response.html || '';
+};
+
+/**
+ * Long-lived `scraplingBridge.py --serve` child speaking newline-delimited JSON.
+ * Up to `concurrency` requests are in flight at once, each tagged with an id so
+ * the bridge can answer out of order from its pool of browser tabs. A request
+ * that times out is rejected; if every in-flight request has timed out the bridge
+ * is treated as wedged, killed, and lazily respawned on the next request. The
+ * child never keeps the Node process alive on its own and exits when its stdin
+ * closes.
+ */
+export class ScraplingBridgeWorker {
+  private child: ChildProcess | null = null;
+  private stdoutBuffer = '';
+  private nextId = 1;
+  // `null` marks a request that already timed out but still holds a bridge slot.
+  private readonly inFlight = new Map<number, PendingBridgeRequest | null>();
+  private readonly waiting: Array<() => void> = [];
+  private idleTimer: ReturnType<typeof setTimeout> | null = null;
+
+  constructor(
+    private readonly pythonCommand: string,
+    private readonly bridgePath: string,
+    private readonly concurrency: number = 1,
+    private readonly idleMs: number = BRIDGE_WORKER_IDLE_MS,
+  ) {}
+
+  async render(
+    payload: Record<string, unknown>,
+    timeoutMs: number,
+  ): Promise<RenderedBridgeResponse> {
+    while (this.inFlight.size >= this.concurrency) {
+      await new Promise<void>((resolvePromise) => this.waiting.push(resolvePromise));
+    }
+    return this.send(payload, timeoutMs);
+  }
+
+  close(): void {
+    this.stop(new Error('Rendered fetch bridge closed'));
+  }
+
+  private send(
+    payload: Record<string, unknown>,
+    timeoutMs: number,
+  ): Promise<RenderedBridgeResponse> {
+    const child = this.ensureChild();
+    const id = this.nextId++;
+    this.clearIdleTimer();
+    return new Promise<RenderedBridgeResponse>((resolvePromise, reject) => {
+      const timer = setTimeout(() => this.abandon(id, timeoutMs), timeoutMs);
+      this.inFlight.set(id, { resolve: resolvePromise, reject, timer });
+      child.stdin?.write(`${JSON.stringify({ ...payload, id })}\n`);
+    });
+  }
+
+  private ensureChild(): ChildProcess {
+    if (this.child) return this.child;
+    const child = spawn(
+      this.pythonCommand,
+      [this.bridgePath, '--serve', '--concurrency', String(this.concurrency)],
+      { shell: false, stdio: ['pipe', 'pipe', 'ignore'] },
+    );
+    child.stdout?.setEncoding('utf8');
+    child.stdout?.on('data', (chunk: string) => this.handleStdout(chunk));
+    child.stdin?.on('error', () => undefined);
+    child.on('error', (error) => this.handleExit(child, error));
+    child.on('exit', (code, signal) => {
+      this.handleExit(child, new Error(`Rendered fetch bridge exited (${signal ?? code})`));
+    });
+    child.unref();
+    for (const stream of [child.stdin, child.stdout]) {
+      (stream as unknown as { unref?: () => void } | null)?.unref?.();
+    }
+    this.child = child;
+    this.stdoutBuffer = '';
+    return child;
+  }
+
+  private handleStdout(chunk: string): void {
+    this.stdoutBuffer += chunk;
+    if (this.stdoutBuffer.length > RENDERED_FETCH_MAX_BUFFER_BYTES) {
+      this.stop(new Error('Rendered fetch bridge response exceeded maxBuffer'));
+      return;
+    }
+    let newline = this.stdoutBuffer.indexOf('\n');
+    while (newline !== -1) {
+      const line = this.stdoutBuffer.slice(0, newline);
+      this.stdoutBuffer = this.stdoutBuffer.slice(newline + 1);
+      let response: RenderedBridgeResponse;
+      try {
+        response = JSON.parse(line) as RenderedBridgeResponse;
+      } catch {
+        this.stop(new Error('Rendered fetch bridge wrote a malformed response'));
+        return;
+      }
+      if (typeof response.id === 'number') this.settle(response.id, response);
+      newline = this.stdoutBuffer.indexOf('\n');
+    }
+  }
+
+  private settle(id: number, response: RenderedBridgeResponse): void {
+    if (!this.inFlight.has(id)) return;
+    const pending = this.inFlight.get(id);
+    this.inFlight.delete(id);
+    if (pending) {
+      clearTimeout(pending.timer);
+      pending.resolve(response);
+    }
+    this.waiting.shift()?.();
+    if (this.inFlight.size === 0 && this.waiting.length === 0) this.scheduleIdleShutdown();
+  }
+
+  private abandon(id: number, timeoutMs: number): void {
+    const pending = this.inFlight.get(id);
+    if (!pending) return;
+    this.inFlight.set(id, null);
+    pending.reject(new Error(`Rendered fetch bridge timed out after ${timeoutMs}ms`));
+    if ([...this.inFlight.values()].every((entry) => entry === null)) {
+      this.stop(new Error('Rendered fetch bridge stopped responding'));
+    }
+  }
+
+  private handleExit(child: ChildProcess, error: Error): void {
+    if (this.child !== child) return;
+    this.child = null;
+    this.stdoutBuffer = '';
+    this.clearIdleTimer();
+    const pending = [...this.inFlight.values()];
+    this.inFlight.clear();
+    for (const entry of pending) {
+      if (!entry) continue;
+      clearTimeout(entry.timer);
+      entry.reject(error);
+    }
+    for (const wake of this.waiting.splice(0)) wake();
+  }
+
+  private stop(error: Error): void {
+    const child = this.child;
+    if (!child) return;
+    this.handleExit(child, error);
+    child.kill();
+  }
+
+  private scheduleIdleShutdown(): void {
+    this.clearIdleTimer();
+    this.idleTimer = setTimeout(() => this.close(), this.idleMs);
+    this.idleTimer.unref?.();
+  }
+
+  private clearIdleTimer(): void {
+    if (this.idleTimer) clearTimeout(this.idleTimer);
+    this.idleTimer = null;
+  }
+}
+
 const isHttpRedirectStatus = (statusCode: number | undefined): boolean =>
   typeof statusCode === 'number' && statusCode >= 300 && statusCode < 400;
 
@@ -282,6 +545,11 @@ function boundedRenderedFetchTimeout(value: unknown, fallback: number): number {
   );
 }
 
+function boundedBridgeConcurrency(value: number | undefined): number {
+  const candidate = typeof value === 'number' && Number.isFinite(value) ? Math.floor(value) : 1;
+  return Math.min(Math.max(candidate, 1), MAX_BRIDGE_WORKER_CONCURRENCY);
+}
+
 export function createScraplingRenderedFetcher(
   options: ScraplingRenderedFetcherOptions = {},
 ): RenderedFetcher | null {
@@ -302,6 +570,13 @@ export function createScraplingRenderedFetcher(
       DEFAULT_TIMEOUT_MS,
     );
   const seedRedirectCheck = options.seedRedirectCheck || defaultRenderedSeedRedirectCheck;
+  const persistent = options.persistent ?? process.env.SCRAPLING_BRIDGE_PERSISTENT === 'true';
+  const concurrency = boundedBridgeConcurrency(
+    options.concurrency || numberFromEnv(process.env.SCRAPLING_BRIDGE_CONCURRENCY),
+  );
+  const worker = persistent
+    ? new ScraplingBridgeWorker(pythonCommand, bridgePath, concurrency)
+    : null;
 
   return async (request) => {
     // SSRF guard: request.url originates from DB-stored / scraped values. Block private/metadata
@@ -332,31 +607,53 @@ export function createScraplingRenderedFetcher(
       };
     }
 
-    const args = [
-      bridgePath,
-      '--url',
-      safeRequestUrl,
-      '--mode',
-      normalizeRenderedFetchMode(request.mode || defaultMode),
-      '--timeout-ms',
-      String(timeoutMs),
-    ];
+    const mode = normalizeRenderedFetchMode(request.mode || defaultMode);
     const waitSelector = normalizeRenderedFetchSelector(request.waitSelector);
-    if (waitSelector) args.push('--wait-selector', waitSelector);
+    const profile = normalizeRenderedFetchProfile(request.profile);
+    const extract = normalizeRenderedFetchExtract(request.extract);
 
     try {
-      const { stdout } = await execFileAsync(pythonCommand, args, {
-        timeout: timeoutMs + 5_000,
-        maxBuffer: 10 * 1024 * 1024,
-        shell: false,
-      });
-      const parsed = JSON.parse(stdout) as {
-        url?: string;
-        html?: string;
-        statusCode?: number;
-        blocked?: boolean;
-        blockedReason?: string;
-      };
+      let parsed: RenderedBridgeResponse;
+      if (worker) {
+        parsed = await worker.render(
+          {
+            url: safeRequestUrl,
+            mode,
+            timeoutMs,
+            waitSelector,
+            profile,
+            extract,
+            htmlTransport: 'gzip',
+            maxHtmlBytes: RENDERED_FETCH_MAX_HTML_BYTES,
+          },
+          timeoutMs + RENDERED_FETCH_GRACE_MS,
+        );
+      } else {
+        const args = [
+          bridgePath,
+          '--url',
+          safeRequestUrl,
+          '--mode',
+          mode,
+          '--timeout-ms',
+          String(timeoutMs),
+          '--html-transport',
+          'gzip',
+          '--max-html-bytes',
+          String(RENDERED_FETCH_MAX_HTML_BYTES),
+        ];
+        if (waitSelector) args.push('--wait-selector', waitSelector);
+        if (profile) args.push('--profile', profile);
+        for (const [name, selector] of Object.entries(extract ?? {})) {
+          args.push('--extract', `${name}=${selector}`);
+        }
+        const { stdout } = await execFileAsync(pythonCommand, args, {
+          timeout: timeoutMs + RENDERED_FETCH_GRACE_MS,
+          maxBuffer: RENDERED_FETCH_MAX_BUFFER_BYTES,
+          shell: false,
+        });
+        parsed = JSON.parse(stdout) as RenderedBridgeResponse;
+      }
       const renderedUrl = parsed.url || safeRequestUrl;
       let finalUrl: URL;
       try {
@@ -384,12 +681,27 @@ export function createScraplingRenderedFetcher(
           fetchMode: 'scrapling',
         };
       }
+      if (extract && parsed.fragments !== undefined) {
+        const fragments = renderedBridgeFragments(parsed.fragments, extract);
+        return {
+          url: finalUrl.toString(),
+          html: Object.values(fragments)
+            .flatMap((matches) => matches.map((fragment) => fragment.html))
+            .join('\n'),
+          statusCode: parsed.statusCode,
+          blocked: parsed.blocked,
+          blockedReason: parsed.blockedReason,
+          fragments,
+          fetchMode: 'scrapling',
+        };
+      }
       return {
         url: finalUrl.toString(),
-        html: parsed.html || '',
+        html: renderedBridgeHtml(parsed),
         statusCode: parsed.statusCode,
         blocked: parsed.blocked,
         blockedReason: parsed.blockedReason,
+        htmlTruncated: parsed.htmlTruncated,
         fetchMode: 'scrapling',
       };
     } catch (err: any) {
@@ -4,76 +4,813 @@
 This keeps Scrapling as an optional runtime dependency. The Node scraper layer
 passes a URL and receives rendered HTML, while all domain extraction remains in
 TypeScript.
+
+Two invocation styles are supported:
+
+* ``--url URL`` renders one page and prints one JSON object.
+* ``--serve`` keeps the interpreter and a warm browser session alive, reading
+  newline-delimited JSON requests (``{"id", "url", "mode", "timeoutMs",
+  "waitSelector"}``) from stdin and writing one JSON response per line. Up to
+  ``--concurrency`` requests render at once in a shared pool of browser tabs,
+  so responses may come back out of order; each echoes its request ``id``.
+* ``--urls-file PATH`` (``-`` for stdin) renders one URL per line with the
+  ``--mode``/``--timeout-ms``/``--wait-selector`` flags and streams one JSON
+  object per URL as soon as it finishes, in the same pooled browser.
+
+Large documents can be shipped as gzip/zstd-compressed base64 (``htmlData``)
+or written to a temp file (``htmlPath``) via ``--html-transport``, and capped
+at ``--max-html-bytes`` of page body, reported through ``htmlTruncated``.
+
+``--profile`` (or a request's ``profile``) picks a named render budget from
+RENDER_PROFILES: which resource types and third-party hosts to block, whether
+to wait for network idle or only for the wait selector, and a render time cap.
+In the pooled modes every render also has a wall-clock deadline (``timeoutMs``,
+or the profile's cap if lower); a render past it is cancelled, freeing its tab,
+and reported as ``render-deadline-exceeded``. Each result reports the
+``profile`` used and per-phase ``phases`` timings.
+``--extract NAME=SELECTOR`` (repeatable, or a request's ``extract`` object)
+evaluates the CSS selectors inside the rendered page and returns
+``fragments`` (``{name: [{"html", "text"}]}``, outer HTML and text content of
+every match) in place of the document, so callers that only read a table or a
+bio block never ship or re-parse the rest of the DOM.
+``--metrics`` (or a request's ``metrics``) adds a ``timings`` object covering
+interpreter start, Scrapling import, browser launch, navigation, selector
+wait, body decode and serialization, plus peak RSS and the HTML byte count.
 """
 
 from __future__ import annotations
 
 import argparse
+import asyncio
+import base64
+import codecs
+import gzip
 import json
+import os
+import re
 import sys
+import tempfile
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, NamedTuple, TextIO
+
+MODES = ("dynamic", "stealthy")
+HTML_TRANSPORTS = ("inline", "gzip", "zstd", "file")
+DEFAULT_TIMEOUT_MS = 30000
+
+# Resource types that never carry extractable content (Scrapling's disable_resources set).
+STATIC_RESOURCE_TYPES = frozenset(
+    {
+        "font",
+        "image",
+        "media",
+        "beacon",
+        "object",
+        "imageset",
+        "texttrack",
+        "websocket",
+        "csp_report",
+        "stylesheet",
+    }
+)
+# Analytics/tag hosts common on department sites; subdomains are matched too.
+TRACKER_DOMAINS = frozenset(
+    {
+        "google-analytics.com",
+        "googletagmanager.com",
+        "doubleclick.net",
+        "siteimproveanalytics.com",
+        "siteimproveanalytics.io",
+        "hotjar.com",
+        "connect.facebook.net",
+        "nr-data.net",
+        "newrelic.com",
+        "addthis.com",
+        "addtoany.com",
+        "static.addtoany.com",
+    }
+)
+
+
+class RenderProfile(NamedTuple):
+    blocked_resource_types: frozenset
+    blocked_domains: frozenset
+    network_idle: bool
+    max_render_ms: int | None
+
+
+# Scrapling retries a failed fetch this many times (its own default), a second apart.
+# Capped profiles get one attempt so that their cap bounds the whole render.
+SCRAPLING_RETRIES = 3
+
+RENDER_PROFILES: Dict[str, RenderProfile] = {
+    # The historical behaviour: drop static resources and wait for network idle.
+    "default": RenderProfile(STATIC_RESOURCE_TYPES, frozenset(), True, None),
+    # Server-rendered people/directory tables: the selector is enough.
+    "directory-listing": RenderProfile(STATIC_RESOURCE_TYPES, TRACKER_DOMAINS, False, 15000),
+    "profile-page": RenderProfile(STATIC_RESOURCE_TYPES, TRACKER_DOMAINS, False, 10000),
+    # Client-rendered apps fetch their content over XHR/websockets after load.
+    "spa-heavy": RenderProfile(
+        STATIC_RESOURCE_TYPES - {"websocket"}, TRACKER_DOMAINS, True, DEFAULT_TIMEOUT_MS
+    ),
+}
+
+# Process-wide costs reported by --metrics; importMs is filled in once Scrapling loads.
+STARTUP_TIMINGS: Dict[str, float | None] = {}
+
+
+def process_age_ms() -> float | None:
+    """Milliseconds since this process was exec'd, from /proc (Linux only)."""
+    try:
+        with open("/proc/self/stat", "rb") as stat:
+            # Fields after the parenthesised command start at field 3; starttime is field 22.
+            start_ticks = int(stat.read().rsplit(b")", 1)[1].split()[19])
+        with open("/proc/uptime", "rb") as uptime:
+            uptime_s = float(uptime.read().split()[0])
+        return round((uptime_s - start_ticks / os.sysconf("SC_CLK_TCK")) * 1000, 1)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def peak_rss_bytes() -> int | None:
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+STARTUP_TIMINGS["interpreterMs"] = process_age_ms()
+
+# Challenge and denial interstitials are small and announce themselves early, so
+# block detection only scans the head of the document rather than all of it.
+BLOCK_SCAN_BYTES = 64 * 1024
+BLOCK_STATUSES = frozenset({401, 403, 429, 503})
+# (reason, patterns): every pattern must match inside the scan window. Checked in order.
+BLOCK_MARKERS = (
+    ("cloudflare-challenge", (re.compile(rb"cf-challenge", re.IGNORECASE),)),
+    (
+        "cloudflare-challenge",
+        (re.compile(rb"cloudflare", re.IGNORECASE), re.compile(rb"challenge", re.IGNORECASE)),
+    ),
+    ("captcha-or-turnstile", (re.compile(rb"captcha|turnstile", re.IGNORECASE),)),
+    ("access-denied", (re.compile(rb"access denied", re.IGNORECASE),)),
+)
 
 
 def main() -> int:
     parser = argparse.ArgumentParser()
-    parser.add_argument("--url", required=True)
-    parser.add_argument("--mode", choices=["dynamic", "stealthy"], default="dynamic")
-    parser.add_argument("--timeout-ms", type=int, default=30000)
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--mode", choices=MODES, default="dynamic")
+    parser.add_argument("--timeout-ms", type=int, default=DEFAULT_TIMEOUT_MS)
     parser.add_argument("--wait-selector", default=None)
+    parser.add_argument("--profile", choices=sorted(RENDER_PROFILES), default="default")
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="add per-phase timings, peak RSS and HTML size to each result",
+    )
+    parser.add_argument(
+        "--extract",
+        action="append",
+        default=[],
+        metavar="NAME=SELECTOR",
+        help="return the outer HTML/text of matches for SELECTOR under NAME instead of the page",
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="read newline-delimited JSON requests from stdin and reuse one browser session",
+    )
+    parser.add_argument("--html-transport", choices=HTML_TRANSPORTS, default="inline")
+    parser.add_argument(
+        "--max-html-bytes",
+        type=int,
+        default=0,
+        help="truncate the page body to this many bytes (0 = unlimited)",
+    )
+    parser.add_argument(
+        "--html-dir",
+        default=None,
+        help="directory for --html-transport file output (default: system temp dir)",
+    )
+    parser.add_argument(
+        "--urls-file",
+        default=None,
+        help="render every URL listed in this file ('-' for stdin), streaming JSONL results",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="maximum number of pages rendered at once in --serve/--urls-file mode",
+    )
     args = parser.parse_args()
+    if sum(bool(option) for option in (args.url, args.serve, args.urls_file)) != 1:
+        parser.error("exactly one of --url, --serve or --urls-file is required")
+
+    try:
+        extract = parse_extract_args(args.extract)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    concurrency = max(1, args.concurrency)
+    options = {
+        "profile": args.profile,
+        "htmlTransport": args.html_transport,
+        "maxHtmlBytes": max(0, args.max_html_bytes),
+        "htmlDir": args.html_dir,
+        "metrics": args.metrics,
+        "extract": extract,
+    }
+    if args.serve:
+        requests = serve_requests(sys.stdin, sys.stdout, options)
+        return asyncio.run(pool_main(requests, sys.stdout, concurrency))
+    if args.urls_file:
+        defaults = {
+            "mode": args.mode,
+            "timeoutMs": args.timeout_ms,
+            "waitSelector": args.wait_selector,
+            **options,
+        }
+        if args.urls_file == "-":
+            requests = batch_requests(sys.stdin, defaults)
+            return asyncio.run(pool_main(requests, sys.stdout, concurrency))
+        with open(args.urls_file, encoding="utf-8") as urls:
+            requests = batch_requests(urls, defaults)
+            return asyncio.run(pool_main(requests, sys.stdout, concurrency))
 
+    started = time.perf_counter()
     try:
-        from scrapling.fetchers import DynamicFetcher, StealthyFetcher
+        from scrapling.fetchers import DynamicSession, StealthySession
     except Exception as exc:  # pragma: no cover - exercised from Node in prod
         return fail(f"scrapling-import-failed: {exc}")
+    STARTUP_TIMINGS["importMs"] = elapsed_ms(started, time.perf_counter())
 
-    fetcher = StealthyFetcher if args.mode == "stealthy" else DynamicFetcher
-    kwargs = {
-        "headless": True,
-        "network_idle": True,
-        "timeout": args.timeout_ms,
-        "disable_resources": True,
+    session_class = StealthySession if args.mode == "stealthy" else DynamicSession
+
+    def fetch_once(_mode: str, url: str, kwargs: Dict[str, Any], clock: PhaseClock) -> Any:
+        launched = time.perf_counter()
+        retries = kwargs.pop("retries")
+        with session_class(headless=True, retries=retries) as session:
+            clock.add("launchMs", elapsed_ms(launched, time.perf_counter()))
+            return session.fetch(url, **kwargs)
+
+    request = {
+        "url": args.url,
+        "mode": args.mode,
+        "timeoutMs": args.timeout_ms,
+        "waitSelector": args.wait_selector,
+        **options,
     }
-    if args.wait_selector:
-        kwargs["wait_selector"] = args.wait_selector
+    print(encode_output(render(fetch_once, request)))
+    return 0
+
 
+async def pool_main(
+    requests: AsyncIterator[Dict[str, Any]], stdout: TextIO, concurrency: int
+) -> int:
+    started = time.perf_counter()
     try:
-        page = fetcher.fetch(args.url, **kwargs)
-        body = getattr(page, "body", b"") or b""
-        encoding = getattr(page, "encoding", None) or "utf-8"
-        html = body.decode(encoding, errors="replace") if isinstance(body, bytes) else str(body)
-        output = {
-            "url": getattr(page, "url", None) or args.url,
-            "statusCode": getattr(page, "status", None),
-            "html": html,
-            "blocked": is_blocked(html, getattr(page, "status", None)),
-            "blockedReason": blocked_reason(html, getattr(page, "status", None)),
-        }
-        print(json.dumps(output))
+        from scrapling.fetchers import AsyncDynamicSession, AsyncStealthySession
+    except Exception as exc:  # pragma: no cover - exercised from Node in prod
+        message = f"scrapling-import-failed: {exc}"
+        async for request in requests:
+            write_line(stdout, request_output(failure_output(message), request))
         return 0
+    STARTUP_TIMINGS["importMs"] = elapsed_ms(started, time.perf_counter())
+
+    sessions = SessionPool(
+        {"dynamic": AsyncDynamicSession, "stealthy": AsyncStealthySession},
+        max_pages=concurrency,
+    )
+    try:
+        return await render_pool(requests, stdout, sessions.fetch, concurrency)
+    finally:
+        await sessions.close()
+
+
+class SessionPool:
+    """Lazily started, reused browser sessions keyed by fetch mode and retry count.
+
+    Each session holds up to ``max_pages`` tabs, so concurrent fetches for the
+    same mode and retry count share one browser.
+    """
+
+    def __init__(self, session_classes: Dict[str, Any], max_pages: int = 1):
+        self._session_classes = session_classes
+        self._max_pages = max_pages
+        self._sessions: Dict[tuple[str, int], Any] = {}
+        self._in_flight: Dict[tuple[str, int], int] = {}
+        self._lock = asyncio.Lock()
+
+    async def fetch(self, mode: str, url: str, kwargs: Dict[str, Any], clock: PhaseClock) -> Any:
+        # Scrapling only takes retries when a session is created.
+        key = (mode, kwargs.pop("retries"))
+        session = await self._session(key, clock)
+        self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        try:
+            return await session.fetch(url, **kwargs)
+        except Exception:
+            # A failed render can leave the browser wedged; relaunch it on the next
+            # request unless other renders are still using it.
+            if self._in_flight[key] == 1 and self._sessions.get(key) is session:
+                await self._discard(key)
+            raise
+        finally:
+            self._in_flight[key] -= 1
+
+    async def close(self) -> None:
+        for key in list(self._sessions):
+            await self._discard(key)
+
+    async def _session(self, key: tuple[str, int], clock: PhaseClock) -> Any:
+        async with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                mode, retries = key
+                launched = time.perf_counter()
+                session = self._session_classes[mode](
+                    headless=True, max_pages=self._max_pages, retries=retries
+                )
+                await session.start()
+                clock.add("launchMs", elapsed_ms(launched, time.perf_counter()))
+                self._sessions[key] = session
+            return session
+
+    async def _discard(self, key: tuple[str, int]) -> None:
+        session = self._sessions.pop(key, None)
+        if session is None:
+            return
+        try:
+            await session.close()
+        except Exception:  # pragma: no cover - best-effort browser teardown
+            pass
+
+
+Fetch = Callable[[str, str, Dict[str, Any], "PhaseClock"], Any]
+AsyncFetch = Callable[[str, str, Dict[str, Any], "PhaseClock"], Awaitable[Any]]
+
+
+async def render_pool(
+    requests: AsyncIterator[Dict[str, Any]],
+    stdout: TextIO,
+    fetch: AsyncFetch,
+    concurrency: int = 1,
+) -> int:
+    """Render requests with at most ``concurrency`` in flight, writing each result as it lands."""
+    slots = asyncio.Semaphore(concurrency)
+    tasks: set[asyncio.Task[None]] = set()
+
+    async def handle(request: Dict[str, Any]) -> None:
+        try:
+            write_line(stdout, request_output(await render_async(fetch, request), request))
+        finally:
+            slots.release()
+
+    async for request in requests:
+        await slots.acquire()
+        task = asyncio.create_task(handle(request))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    return 0
+
+
+async def serve_requests(
+    stdin: TextIO, stdout: TextIO, defaults: Dict[str, Any]
+) -> AsyncIterator[Dict[str, Any]]:
+    async for line in read_lines(stdin):
+        try:
+            yield parse_request(line, defaults)
+        except ValueError as exc:
+            output = failure_output(f"invalid-request: {exc}")
+            write_line(stdout, with_id(output, peek_request_id(line)))
+
+
+async def batch_requests(
+    urls: TextIO, defaults: Dict[str, Any]
+) -> AsyncIterator[Dict[str, Any]]:
+    async for line in read_lines(urls):
+        if not line.startswith("#"):
+            yield {**defaults, "url": line}
+
+
+async def read_lines(stream: TextIO) -> AsyncIterator[str]:
+    loop = asyncio.get_running_loop()
+    while True:
+        line = await loop.run_in_executor(None, stream.readline)
+        if not line:
+            return
+        line = line.strip()
+        if line:
+            yield line
+
+
+def write_line(stdout: TextIO, output: Dict[str, Any]) -> None:
+    stdout.write(encode_output(output) + "\n")
+    stdout.flush()
+
+
+def encode_output(output: Dict[str, Any]) -> str:
+    timings = output.pop("timings", None)
+    if timings is None:
+        return json.dumps(output)
+    started = time.perf_counter()
+    line = json.dumps(output)
+    # Splice timings in after serializing the document so serializeMs can cover it.
+    timings["serializeMs"] = elapsed_ms(started, time.perf_counter())
+    timings["peakRssBytes"] = peak_rss_bytes()
+    return f'{line[:-1]}, "timings": {json.dumps(timings)}}}'
+
+
+def request_output(output: Dict[str, Any], request: Dict[str, Any]) -> Dict[str, Any]:
+    # Failures carry no URL of their own; batch consumers need it to match results up.
+    if "url" not in output:
+        output = {"url": request["url"], **output}
+    return with_id(output, request.get("id"))
+
+
+def with_id(output: Dict[str, Any], request_id: Any) -> Dict[str, Any]:
+    return {"id": request_id, **output} if request_id is not None else output
+
+
+def peek_request_id(line: str) -> Any:
+    try:
+        payload = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    return payload.get("id") if isinstance(payload, dict) else None
+
+
+def parse_extract_args(values: list[str]) -> Dict[str, str] | None:
+    extract: Dict[str, str] = {}
+    for value in values:
+        name, sep, selector = value.partition("=")
+        if not sep:
+            raise ValueError(f"--extract expects NAME=SELECTOR, got {value!r}")
+        extract[name.strip()] = selector.strip()
+    return validate_extract(extract) if extract else None
+
+
+def validate_extract(extract: Any) -> Dict[str, str]:
+    if not isinstance(extract, dict) or not extract:
+        raise ValueError("extract must map names to CSS selectors")
+    for name, selector in extract.items():
+        if not name or not isinstance(selector, str) or not selector.strip():
+            raise ValueError(f"extract selector for {name!r} must be a non-empty string")
+    return {name: selector.strip() for name, selector in extract.items()}
+
+
+def parse_request(line: str, defaults: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        payload = json.loads(line)
+    except json.JSONDecodeError as exc:
+        raise ValueError(f"malformed json: {exc.msg}") from None
+    if not isinstance(payload, dict):
+        raise ValueError("request must be a JSON object")
+    url = payload.get("url")
+    if not isinstance(url, str) or not url:
+        raise ValueError("url is required")
+    mode = payload.get("mode")
+    timeout_ms = payload.get("timeoutMs")
+    wait_selector = payload.get("waitSelector")
+    profile = payload.get("profile")
+    html_transport = payload.get("htmlTransport")
+    max_html_bytes = payload.get("maxHtmlBytes")
+    metrics = payload.get("metrics")
+    extract = payload.get("extract")
+    return {
+        "id": payload.get("id"),
+        "url": url,
+        "mode": mode if mode in MODES else "dynamic",
+        "timeoutMs": (
+            timeout_ms if isinstance(timeout_ms, int) and timeout_ms > 0 else DEFAULT_TIMEOUT_MS
+        ),
+        "waitSelector": wait_selector if isinstance(wait_selector, str) and wait_selector else None,
+        "profile": profile if profile in RENDER_PROFILES else defaults["profile"],
+        "htmlTransport": (
+            html_transport if html_transport in HTML_TRANSPORTS else defaults["htmlTransport"]
+        ),
+        "maxHtmlBytes": (
+            max_html_bytes
+            if isinstance(max_html_bytes, int) and max_html_bytes >= 0
+            else defaults["maxHtmlBytes"]
+        ),
+        # The output directory is fixed by the bridge's own flags, never by a request.
+        "htmlDir": defaults["htmlDir"],
+        "metrics": metrics if isinstance(metrics, bool) else defaults["metrics"],
+        "extract": validate_extract(extract) if extract is not None else defaults.get("extract"),
+    }
+
+
+def render(fetch: Fetch, request: Dict[str, Any]) -> Dict[str, Any]:
+    clock = PhaseClock()
+    extraction: Dict[str, Any] = {}
+    try:
+        kwargs = fetch_kwargs(request, clock, extraction, is_async=False)
+        page = fetch(request["mode"], request["url"], kwargs, clock)
+        clock.mark("fetched")
+        output = page_output(page, request, clock, extraction)
     except Exception as exc:  # pragma: no cover - exercised from Node in prod
-        return fail(f"scrapling-fetch-failed: {exc}")
+        output = failure_output(f"scrapling-fetch-failed: {exc}")
+    return {**output, **clock.report(request, output)}
+
+
+async def render_async(fetch: AsyncFetch, request: Dict[str, Any]) -> Dict[str, Any]:
+    clock = PhaseClock()
+    extraction: Dict[str, Any] = {}
+    deadline_ms = render_timeout_ms(request)
+    try:
+        kwargs = fetch_kwargs(request, clock, extraction, is_async=True)
+        # Playwright's timeout applies per operation and Scrapling may retry, so bound the
+        # whole render; cancelling the fetch closes its tab for the next request.
+        page = await asyncio.wait_for(
+            fetch(request["mode"], request["url"], kwargs, clock), deadline_ms / 1000
+        )
+        clock.mark("fetched")
+        output = page_output(page, request, clock, extraction)
+    except asyncio.TimeoutError:
+        output = failure_output(f"render-deadline-exceeded: {deadline_ms}ms")
+    except Exception as exc:  # pragma: no cover - exercised from Node in prod
+        output = failure_output(f"scrapling-fetch-failed: {exc}")
+    return {**output, **clock.report(request, output)}
+
+
+PHASES = (("setup", "pageMs"), ("navigated", "navigationMs"), ("fetched", "waitSelectorMs"))
+
+
+class PhaseClock:
+    """Timestamps one render; Scrapling's page_setup/page_action hooks bracket navigation."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.marks: Dict[str, float] = {}
+        self.durations: Dict[str, float] = {}
+
+    def mark(self, name: str) -> None:
+        self.marks[name] = time.perf_counter()
+
+    def add(self, name: str, ms: float) -> None:
+        self.durations[name] = ms
+
+    def report(self, request: Dict[str, Any], output: Dict[str, Any]) -> Dict[str, Any]:
+        phases: Dict[str, float] = {}
+        previous = self.started
+        # page: acquiring a tab (and launching the browser on first use); navigation: goto plus
+        # load/idle waits; waitSelector: the selector wait and the settle after it.
+        for name, phase in PHASES:
+            if name not in self.marks:
+                break
+            phases[phase] = elapsed_ms(previous, self.marks[name])
+            previous = self.marks[name]
+        phases["totalMs"] = elapsed_ms(self.started, time.perf_counter())
+        report: Dict[str, Any] = {"profile": request.get("profile") or "default", "phases": phases}
+        if request.get("metrics"):
+            report["timings"] = {
+                **STARTUP_TIMINGS,
+                "launchMs": self.durations.get("launchMs", 0.0),
+                **{key: value for key, value in phases.items() if key != "pageMs"},
+                "decodeMs": self.durations.get("decodeMs"),
+                "extractMs": self.durations.get("extractMs"),
+                "htmlBytes": output.get("htmlBytes"),
+            }
+        return report
+
+
+def elapsed_ms(start: float, end: float) -> float:
+    return round((end - start) * 1000, 1)
+
+
+def render_timeout_ms(request: Dict[str, Any]) -> int:
+    """The request's timeout, lowered to its profile's render cap if it has one."""
+    profile = RENDER_PROFILES[request.get("profile") or "default"]
+    if profile.max_render_ms is None:
+        return request["timeoutMs"]
+    return min(request["timeoutMs"], profile.max_render_ms)
 
 
-def is_blocked(html: str, status: int | None) -> bool:
-    reason = blocked_reason(html, status)
-    return reason is not None
+def fetch_kwargs(
+    request: Dict[str, Any], clock: PhaseClock, extraction: Dict[str, Any], is_async: bool
+) -> Dict[str, Any]:
+    """Scrapling fetch() arguments, plus ``retries`` for the fetch callable to pop."""
+    profile = RENDER_PROFILES[request.get("profile") or "default"]
+    timeout = render_timeout_ms(request)
+    kwargs: Dict[str, Any] = {
+        "retries": SCRAPLING_RETRIES if profile.max_render_ms is None else 1,
+        "network_idle": profile.network_idle,
+        "timeout": timeout,
+        # Resource types are blocked by our own route (registered in page_setup) so each
+        # profile can choose them; Scrapling's handler only enforces blocked_domains.
+        "disable_resources": False,
+    }
+    if profile.blocked_domains:
+        kwargs["blocked_domains"] = set(profile.blocked_domains)
+    if request.get("waitSelector"):
+        kwargs["wait_selector"] = request["waitSelector"]
+    pending = Extraction(request.get("extract"), request.get("waitSelector"), timeout, extraction)
+    kwargs.update(render_hooks(profile, clock, pending, is_async))
+    return kwargs
+
+
+# Runs in the page: outer HTML and text content of every match, per selector name.
+EXTRACT_SCRIPT = """(selectors) => Object.fromEntries(
+  Object.entries(selectors).map(([name, selector]) => [
+    name,
+    Array.from(document.querySelectorAll(selector), (node) => ({
+      html: node.outerHTML,
+      text: node.textContent || "",
+    })),
+  ]),
+)"""
+
+
+class Extraction(NamedTuple):
+    """A request's ``extract`` selectors; page_action stores ``fragments`` or ``error`` in result."""
+
+    selectors: Dict[str, str] | None
+    wait_selector: str | None
+    timeout_ms: int
+    result: Dict[str, Any]
+
+
+def render_hooks(
+    profile: RenderProfile, clock: PhaseClock, extraction: Extraction, is_async: bool
+) -> Dict[str, Any]:
+    blocked = profile.blocked_resource_types
+    selectors = extraction.selectors
+    wait_selector = extraction.wait_selector
+    # Scrapling runs page_action before its own wait_selector and only logs errors raised in
+    # it, so extraction waits for the selector itself (giving up quietly on timeout, as
+    # Scrapling does) and records any evaluation failure for page_output to report.
+
+    if is_async:
+
+        async def route_async(route: Any) -> None:
+            if route.request.resource_type in blocked:
+                await route.abort()
+            else:
+                await route.fallback()
+
+        async def setup_async(page: Any) -> None:
+            clock.mark("setup")
+            if blocked:
+                await page.route("**/*", route_async)
+
+        async def action_async(page: Any) -> None:
+            clock.mark("navigated")
+            if not selectors:
+                return
+            if wait_selector:
+                try:
+                    await page.wait_for_selector(
+                        wait_selector, state="attached", timeout=extraction.timeout_ms
+                    )
+                except Exception:
+                    pass
+            try:
+                started = time.perf_counter()
+                extraction.result["fragments"] = await page.evaluate(EXTRACT_SCRIPT, selectors)
+                clock.add("extractMs", elapsed_ms(started, time.perf_counter()))
+            except Exception as exc:
+                extraction.result["error"] = str(exc)
+
+        return {"page_setup": setup_async, "page_action": action_async}
+
+    def route_sync(route: Any) -> None:
+        if route.request.resource_type in blocked:
+            route.abort()
+        else:
+            route.fallback()
+
+    def setup_sync(page: Any) -> None:
+        clock.mark("setup")
+        if blocked:
+            page.route("**/*", route_sync)
+
+    def action_sync(page: Any) -> None:
+        clock.mark("navigated")
+        if not selectors:
+            return
+        if wait_selector:
+            try:
+                page.wait_for_selector(wait_selector, state="attached", timeout=extraction.timeout_ms)
+            except Exception:
+                pass
+        try:
+            started = time.perf_counter()
+            extraction.result["fragments"] = page.evaluate(EXTRACT_SCRIPT, selectors)
+            clock.add("extractMs", elapsed_ms(started, time.perf_counter()))
+        except Exception as exc:
+            extraction.result["error"] = str(exc)
+
+    return {"page_setup": setup_sync, "page_action": action_sync}
+
+
+def page_output(
+    page: Any, request: Dict[str, Any], clock: PhaseClock, extraction: Dict[str, Any]
+) -> Dict[str, Any]:
+    body = getattr(page, "body", b"") or b""
+    if not isinstance(body, bytes):
+        body = str(body).encode("utf-8")
+    max_bytes = request.get("maxHtmlBytes") or 0
+    truncated = False
+    if request.get("extract"):
+        if "fragments" not in extraction:
+            raise RuntimeError(f"extract-failed: {extraction.get('error', 'page action did not run')}")
+        # The document stays in the browser; block detection still scans the raw body.
+        fields: Dict[str, Any] = {"html": "", "fragments": extraction["fragments"]}
+    else:
+        truncated = 0 < max_bytes < len(body)
+        encoding = getattr(page, "encoding", None)
+        decode_started = time.perf_counter()
+        html = decode_body(body[:max_bytes] if truncated else body, encoding, truncated)
+        clock.add("decodeMs", elapsed_ms(decode_started, time.perf_counter()))
+        fields = html_fields(html, request.get("htmlTransport") or "inline", request.get("htmlDir"))
+    status = getattr(page, "status", None)
+    detection = detect_block(body, status)
+    return {
+        "url": getattr(page, "url", None) or request["url"],
+        "statusCode": status,
+        **fields,
+        "htmlBytes": len(body),
+        "htmlTruncated": truncated,
+        "blocked": detection.reason is not None,
+        "blockedReason": detection.reason,
+        "blockedMarker": detection.marker,
+        "blockDetectionMs": detection.elapsed_ms,
+    }
+
+
+def decode_body(body: bytes, encoding: str | None, truncated: bool) -> str:
+    try:
+        decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    # A non-final decode holds back a multi-byte character split by the byte cap.
+    return decoder.decode(body, final=not truncated)
+
+
+def html_fields(html: str, transport: str, html_dir: str | None) -> Dict[str, Any]:
+    if transport == "inline":
+        return {"html": html}
+    data = html.encode("utf-8")
+    if transport == "file":
+        fd, path = tempfile.mkstemp(prefix="scrapling-", suffix=".html", dir=html_dir)
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        return {"html": "", "htmlTransport": "file", "htmlPath": path}
+    if transport == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            transport = "gzip"
+        else:
+            data = zstandard.ZstdCompressor().compress(data)
+    if transport == "gzip":
+        data = gzip.compress(data, compresslevel=6)
+    return {
+        "html": "",
+        "htmlTransport": transport,
+        "htmlData": base64.b64encode(data).decode("ascii"),
+    }
+
+
+class BlockDetection(NamedTuple):
+    reason: str | None
+    marker: str | None
+    elapsed_ms: float
+
+
+def detect_block(body: bytes, status: int | None) -> BlockDetection:
+    """Classify a bot-wall/denial page from the status code and the first BLOCK_SCAN_BYTES."""
+    started = time.perf_counter()
+    reason = marker = None
+    if status in BLOCK_STATUSES:
+        reason, marker = f"http-{status}", f"status:{status}"
+    else:
+        window = memoryview(body)[:BLOCK_SCAN_BYTES]
+        for candidate, patterns in BLOCK_MARKERS:
+            matches = [pattern.search(window) for pattern in patterns]
+            if all(matches):
+                reason = candidate
+                marker = "+".join(match.group(0).decode("ascii").lower() for match in matches)
+                break
+    return BlockDetection(reason, marker, round((time.perf_counter() - started) * 1000, 3))
 
 
 def blocked_reason(html: str, status: int | None) -> str | None:
-    text = (html or "").lower()
-    if status in {401, 403, 429, 503}:
-        return f"http-{status}"
-    if "cf-challenge" in text or "cloudflare" in text and "challenge" in text:
-        return "cloudflare-challenge"
-    if "captcha" in text or "turnstile" in text:
-        return "captcha-or-turnstile"
-    if "access denied" in text:
-        return "access-denied"
-    return None
+    return detect_block((html or "").encode("utf-8"), status).reason
+
+
+def failure_output(message: str) -> Dict[str, Any]:
+    return {"html": "", "blocked": False, "blockedReason": message}
 
 
 def fail(message: str) -> int:
-    print(json.dumps({"html": "", "blocked": False, "blockedReason": message}))
+    print(encode_output(failure_output(message)))
     return 0
 
 
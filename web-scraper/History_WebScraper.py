@@ -1,12 +1,31 @@
-import requests
-from bs4 import BeautifulSoup
-import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
-from urllib.parse import urljoin
+import os
+import sys
+from urllib.parse import parse_qs, urljoin, urlsplit
+
+import requests
+
+import scraper_trace
+from scraper_http import (
+    DiskCache, HostHealth, HostRateLimiter, HostUnavailable, cached_get, make_session,
+)
+from scraper_parse import make_soup
 
 BASE_URL = "https://history.yale.edu"
 FACULTY_URL = "https://history.yale.edu/people/faculty"
 
+OUTPUT_FILE = "yale_history_faculty.json"
+# profile_url -> hash of the list row and profile HTML behind each saved record
+HASHES_FILE = "yale_history_faculty.hashes.json"
+
+# The only parts of each page the extractors read (see scraper_parse.py)
+LIST_ONLY = "table.views-table"
+PAGER_ONLY = "li.pager-last"
+PROFILE_ONLY = "div.field-label, div.field-items"
+
 HEADERS = {
     "User-Agent": (
         "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
@@ -15,68 +34,152 @@ HEADERS = {
     )
 }
 
-# Fetch HTML & parse
-def get_soup(url):
+# Profile pages are fetched by a pool of workers sharing one keep-alive
+# session; the per-host token bucket replaces the old fixed 0.5s sleeps.
+WORKERS = 8
+REQUESTS_PER_SECOND = 4.0
+# List pages requested ahead of the one being read when the pager does not
+# say how many there are
+LIST_WINDOW = 3
+# (connect, read): an unreachable host fails on connect instead of the read timeout
+TIMEOUT = (5, 15)
+
+session = make_session(HEADERS, pool_size=WORKERS)
+limiter = HostRateLimiter(REQUESTS_PER_SECOND, burst=2)
+# Backs off on 429/503 and stops calling the site once it keeps failing
+health = HostHealth(max_concurrency=WORKERS)
+cache = DiskCache.from_env()
+
+def configure_http(workers, rate):
+    global session, limiter, health
+    session = make_session(HEADERS, pool_size=workers)
+    limiter = HostRateLimiter(rate, burst=2)
+    health = HostHealth(max_concurrency=workers)
+
+# Fetch HTML
+def get_html(url):
     try:
-        r = requests.get(url, headers=HEADERS, timeout=15)
+        r = cached_get(session, url, cache, limiter, health=health, timeout=TIMEOUT)
         r.raise_for_status()
-        return BeautifulSoup(r.text, "html.parser")
+        return r.text
+    except HostUnavailable as e:
+        print(f"Skipping {url}: {e}")
+        return None
     except Exception as e:
         print(f"Error fetching {url}: {e}")
         return None
 
+# Fetch HTML & parse
+def get_soup(url, only=None):
+    html = get_html(url)
+    if html is None:
+        return None
+    with scraper_trace.phase(url, "parse"):
+        return make_soup(html, only)
+
 def get_faculty_list():
+    return list(iter_faculty())
+
+# Yield list rows in page order, while later list pages are still loading.
+# A list page that cannot be fetched raises instead of ending the list early.
+def iter_faculty(window=LIST_WINDOW):
+    rows, last_page = get_list_page(0)
+    if rows is None:
+        return
+    yield from rows
+
+    # Request every page the pager promises, or keep `window` pages in flight
+    # and drop whatever comes back past the first empty one.
+    list_pool = ThreadPoolExecutor(max_workers=window)
+    ahead = {}
+    try:
+        page = 1
+        while True:
+            stop = last_page if last_page is not None else page + window - 1
+            for upcoming in range(page, stop + 1):
+                if upcoming not in ahead:
+                    ahead[upcoming] = list_pool.submit(get_list_page, upcoming)
+            if page not in ahead:
+                break  # past the pager's last page
+            rows, _ = ahead.pop(page).result()
+            if rows is None:
+                break  # No more pages
+            yield from rows
+            page += 1
+    finally:
+        # Pages still in flight are past the end or unwanted after an error.
+        list_pool.shutdown(wait=False, cancel_futures=True)
+
+# Rows of one list page (None when it is empty or not found), and on the
+# first page the pager's last page number when it has one. Fetch errors and
+# a skipped host raise: treating them as the end would truncate the output.
+def get_list_page(page):
+    url = f"{FACULTY_URL}?page={page}"
+    print("Loading list page:", url)
+
+    r = cached_get(session, url, cache, limiter, health=health, timeout=TIMEOUT)
+    if r.status_code == 404:
+        return None, None
+    r.raise_for_status()
+    html = r.text
+    with scraper_trace.phase(url, "parse"):
+        soup = make_soup(html, LIST_ONLY)
+        pager = make_soup(html, PAGER_ONLY) if page == 0 else None
+    with scraper_trace.phase(url, "extract"):
+        rows = parse_faculty_rows(soup)
+        last_page = parse_last_page(pager) if pager is not None else None
+    return rows, last_page
+
+def parse_last_page(soup):
+    link = soup.select_one("li.pager-last a[href]")
+    if not link:
+        return None
+    page = parse_qs(urlsplit(link["href"]).query).get("page", [""])[0]
+    return int(page) if page.isdigit() else None
+
+# Parse one list page; None when its table has no rows
+def parse_faculty_rows(soup):
+    rows = soup.select("table.views-table tbody tr")
+    if not rows:
+        return None
+
     faculty = []
-    page = 0
-
-    while True:
-        url = f"{FACULTY_URL}?page={page}"
-        print("Loading list page:", url)
-
-        soup = get_soup(url)
-        if not soup:
-            break
-
-        rows = soup.select("table.views-table tbody tr")
-        if not rows:
-            break  # No more pages
-
-        for row in rows:
-            # Name + profile URL
-            name_link = row.select_one("td.views-field-name a")
-            if not name_link:
-                continue
-
-            name = name_link.get_text(strip=True)
-            profile_url = urljoin(BASE_URL, name_link["href"])
-
-            # Fields of interest
-            interest_cell = row.select_one(
-                "td.views-field-field-field-s-of-interest"
-            )
-            fields_of_interest = (
-                interest_cell.get_text(" ", strip=True)
-                if interest_cell
-                else None
-            )
-
-            faculty.append({
-                "name": name,
-                "profile_url": profile_url,
-                "fields_of_interest": fields_of_interest
-            })
-
-        page += 1
-        time.sleep(0.5)
+    for row in rows:
+        # Name + profile URL
+        name_link = row.select_one("td.views-field-name a")
+        if not name_link:
+            continue
+
+        name = name_link.get_text(strip=True)
+        profile_url = urljoin(BASE_URL, name_link["href"])
+
+        # Fields of interest
+        interest_cell = row.select_one(
+            "td.views-field-field-field-s-of-interest"
+        )
+        fields_of_interest = (
+            interest_cell.get_text(" ", strip=True)
+            if interest_cell
+            else None
+        )
+
+        faculty.append({
+            "name": name,
+            "profile_url": profile_url,
+            "fields_of_interest": fields_of_interest
+        })
 
     return faculty
 
 # Extract full bio
 def extract_full_bio(profile_url):
-    soup = get_soup(profile_url)
+    soup = get_soup(profile_url, PROFILE_ONLY)
     if not soup:
         return None
+    with scraper_trace.phase(profile_url, "extract"):
+        return parse_bio(soup)
 
+def parse_bio(soup):
     # Find the bio section - it's in a div with a label "Bio:"
     bio_parts = []
 
@@ -103,31 +206,76 @@ def extract_full_bio(profile_url):
                         bio_parts.append(text)
                 break
 
-    # Also check for publications and awards if present
-    publications = []
-    for label in soup.find_all("strong"):
-        if "Publications" in label.get_text():
-            parent = label.find_parent()
-            if parent:
-                items = parent.find_all("li")
-                for item in items:
-                    publications.append(item.get_text(strip=True))
-
     # Join bio parts
     bio_text = "\n\n".join(bio_parts) if bio_parts else None
 
     return bio_text
+def content_hash(person, html):
+    digest = hashlib.sha256()
+    for part in (person["name"], person["fields_of_interest"] or "", html):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def load_previous():
+    """Records and content hashes from the last run, keyed by profile_url."""
+    try:
+        with open(OUTPUT_FILE, encoding="utf-8") as f:
+            records = {record["profile_url"]: record for record in json.load(f)}
+        with open(HASHES_FILE, encoding="utf-8") as f:
+            hashes = json.load(f)
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}, {}
+    return records, hashes
+
+# Re-extract one profile unless its list row and page are unchanged since the last run
+def refresh_bio(person, previous, hashes):
+    url = person["profile_url"]
+    html = get_html(url)
+    old = previous.get(url)
+    if html is None:
+        # Keep the last good bio rather than wiping it on a transient error.
+        return (old["bio"] if old else None), hashes.get(url), "failed"
+    digest = content_hash(person, html)
+    if old is not None and hashes.get(url) == digest:
+        return old["bio"], digest, "unchanged"
+    with scraper_trace.phase(url, "parse"):
+        soup = make_soup(html, PROFILE_ONLY)
+    with scraper_trace.phase(url, "extract"):
+        bio = parse_bio(soup)
+    return bio, digest, "changed" if old is not None else "new"
+
 # Scrape all faculty
-def scrape_all():
-    faculty = get_faculty_list()
-    print(f"Found {len(faculty)} faculty")
+def scrape_all(workers=WORKERS, incremental=True):
+    previous, hashes = load_previous() if incremental else ({}, {})
+    if previous:
+        print(f"Loaded {len(previous)} records from {OUTPUT_FILE}")
 
     results = []
+    new_hashes = {}
+    counts = {}
 
-    for i, person in enumerate(faculty, 1):
-        print(f"[{i}/{len(faculty)}] Scraping {person['name']}")
-        bio = extract_full_bio(person["profile_url"])
+    # Profiles start as soon as their list page is read; results are
+    # collected in submission order, so the output matches a serial run.
+    pool = ThreadPoolExecutor(max_workers=workers)
+    faculty = []
+    refreshed = []
+    try:
+        for person in iter_faculty():
+            faculty.append(person)
+            refreshed.append(pool.submit(refresh_bio, person, previous, hashes))
+    except BaseException:
+        # The run is aborting; don't wait for profiles nobody will save.
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    print(f"Found {len(faculty)} faculty")
 
+    for i, (person, future) in enumerate(zip(faculty, refreshed), 1):
+        bio, digest, status = future.result()
+        print(f"[{i}/{len(faculty)}] {status.capitalize()}: {person['name']}")
+        counts[status] = counts.get(status, 0) + 1
+        if digest:
+            new_hashes[person["profile_url"]] = digest
         results.append({
             "name": person["name"],
             "department": "History",
@@ -135,13 +283,32 @@ def scrape_all():
             "fields_of_interest": person["fields_of_interest"],
             "bio": bio
         })
+    pool.shutdown()
 
-        time.sleep(0.5)  # polite scraping
-
-    with open("yale_history_faculty.json", "w", encoding="utf-8") as f:
+    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
         json.dump(results, f, indent=2, ensure_ascii=False)
+    tmp = HASHES_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(new_hashes, f, indent=2)
+    os.replace(tmp, HASHES_FILE)
 
-    print(f"Saved yale_history_faculty.json with {len(results)} faculty members")
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+    print(f"Saved {OUTPUT_FILE} with {len(results)} faculty members ({summary})")
+    health.print_summary()
 
 if __name__ == "__main__":
-    scrape_all()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape Yale History faculty profiles.")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="concurrent profile fetches")
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SECOND,
+                        help="max requests per second to history.yale.edu")
+    parser.add_argument("--full", action="store_true",
+                        help=f"re-extract every profile instead of reusing unchanged records "
+                             f"from {OUTPUT_FILE}")
+    args = parser.parse_args()
+    configure_http(max(1, args.workers), args.rate)
+    try:
+        scrape_all(max(1, args.workers), incremental=not args.full)
+    except (HostUnavailable, requests.RequestException) as e:
+        health.print_summary()
+        sys.exit(f"Could not load the faculty list ({e}); {OUTPUT_FILE} was left unchanged")
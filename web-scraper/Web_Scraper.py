@@ -3,76 +3,274 @@ Scrapes the yale directory website in order to find information about all listed
 Eventually will create default RDB listings for all professors on the directory website
 """
 
-import requests
+import csv
+import json
+import os
+import queue
+import re
+import sys
+import threading
 import time
+from dataclasses import asdict, astuple, dataclass, fields
 from selenium import webdriver
-from bs4 import BeautifulSoup
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from string import ascii_lowercase
 
+import scraper_trace
+from scraper_parse import make_soup
+
 BASE_URL = "https://physics.yale.edu/people"
 
-driver = webdriver.Chrome()
+# Number of browsers crawling the prefix space in parallel
+NUM_DRIVERS = int(os.environ.get("SCRAPER_DRIVERS", 4))
+# Searches per prefix before it is given up on (and reported as unsearched)
+MAX_PREFIX_ATTEMPTS = 3
 
 def getURL(lastName):
     return BASE_URL + lastName
 
-def getSite(lastName, maxSearchDuration = 3):
+# Resolves once #loading-indicator exists and is no longer shown inline, or
+# after the timeout. A MutationObserver reacts to the change itself instead
+# of sampling the page from Python.
+WAIT_FOR_RESULTS_SCRIPT = """
+const timeoutMs = arguments[0];
+const done = arguments[arguments.length - 1];
+const ready = () => {
+    const indicator = document.getElementById('loading-indicator');
+    return !!indicator && !(indicator.getAttribute('style') || '').includes('inline');
+};
+if (ready()) return done(true);
+const observer = new MutationObserver(() => {
+    if (ready()) { observer.disconnect(); clearTimeout(timer); done(true); }
+});
+observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true, attributeFilter: ['style']});
+const timer = setTimeout(() => { observer.disconnect(); done(false); }, timeoutMs);
+"""
+
+def getSite(driver, lastName, maxSearchDuration = 3):
+    """Returns (page source, seconds spent waiting for the results to load)"""
     driver.get(getURL(lastName))
-    searchDuration = 0
-    while(((getSoup(driver.page_source).find(id = 'loading-indicator') == None) | ('inline' in getSoup(driver.page_source).find(id = 'loading-indicator')['style'])) & (searchDuration < maxSearchDuration)):
-        time.sleep(0.1)
-        searchDuration += 0.1
-    return driver.page_source
+    start = time.perf_counter()
+    try:
+        driver.execute_async_script(WAIT_FOR_RESULTS_SCRIPT, int(maxSearchDuration * 1000))
+    except TimeoutException:
+        pass
+    return driver.page_source, time.perf_counter() - start
 
 def getSoup(site):
-    return BeautifulSoup(site, 'html.parser')
+    return make_soup(site)
 
-def addListings(listings, nameStr = '', startChar = 'a', endChar = 'c', display = False):
-    for c in ascii_lowercase[ascii_lowercase.index(startChar):(ascii_lowercase.index(endChar) + 1)]:
-        soup = getSoup(getSite(nameStr + c))
+@dataclass(slots = True)
+class DirectoryRecord:
+    """One person from a directory_item article; a few hundred bytes instead of a soup tree"""
+    name: str | None
+    title: str | None
+    department: str | None
+    email: str | None
+    netid: str | None
 
-        resultsText = soup.find(id = 'results-people-header').text
+    def key(self):
+        return self.netid or self.email or (self.name, self.title, self.department)
 
-        numResults = int(resultsText.split(' ')[0]) if resultsText.split(' ')[0].isdigit() else 1 if 'display: none' in soup.find(id = 'bps-result-region')['style'].split(';') else 0
+# Labels a directory_item shows before each value, as "Label: value" in one
+# element or the label and value in neighbouring ones. Only whole labels count,
+# so "Title" never matches inside a longer line and a field that is not on the
+# page stays None rather than picking up something else.
+FIELD_LABELS = {
+    'title': ('title', 'position'),
+    'department': ('department', 'organization'),
+    'netid': ('netid',),
+}
 
-        if(display):
-            if(numResults == 25):
-                print(f'Searching "{nameStr + c}"... Found {numResults} results')
+def labelledFields(article):
+    """field -> text of the value after its label (see FIELD_LABELS)"""
+    byLabel = {label: field for field, labels in FIELD_LABELS.items() for label in labels}
+    values = {}
+    lines = article.get_text('\n', strip = True).split('\n')
+    for i, line in enumerate(lines):
+        label, _, value = line.partition(':')
+        field = byLabel.get(label.strip().lower())
+        if field is None or field in values:
+            continue
+        value = value.strip() or (lines[i + 1].strip() if i + 1 < len(lines) else '')
+        if value and value.rstrip(':').strip().lower() not in byLabel:
+            values[field] = value
+    return values
 
-        surplusResults = numResults != 1 and 'display: block' in soup.find(id = 'bps-result-region').find('div', class_ = 'directory_results_warning')['style'].split(';')
+def extractRecord(article):
+    heading = article.find(re.compile('^h[1-6]$'))
+    emailTag = article.find('a', href = re.compile('^mailto:', re.I))
+    labelled = labelledFields(article)
+    return DirectoryRecord(
+        name = heading.get_text(' ', strip = True) if heading else None,
+        title = labelled.get('title'),
+        department = labelled.get('department'),
+        email = emailTag['href'][len('mailto:'):].split('?')[0] if emailTag else None,
+        netid = labelled.get('netid'),
+    )
 
-        #Handle surplus results
-        if(surplusResults):
-            addListings(listings = listings, nameStr = nameStr + c)
-        else:
-            listings.extend(soup.find_all("article", class_ = "directory_item")[0:numResults])
+class ListingWriter:
+    """Streams de-duplicated records to CSV and/or JSONL, flushing after every prefix"""
 
-def getListings(startChar = 'a', endChar = 'z', display = False):
-    listings = []
-    addListings(listings = listings, startChar = startChar, endChar = endChar, display = display)
-    return listings
+    def __init__(self, csvPath = 'listings.csv', jsonlPath = None):
+        self.lock = threading.Lock()
+        self.seen = set()
+        self.count = 0
+        self.files = []
+        self.csvWriter = None
+        self.jsonlFile = None
+        if csvPath:
+            csvFile = open(csvPath, mode = 'w', newline = '', encoding = 'utf-8')
+            self.files.append(csvFile)
+            self.csvWriter = csv.writer(csvFile)
+            self.csvWriter.writerow([field.name for field in fields(DirectoryRecord)])  # Header row
+        if jsonlPath:
+            self.jsonlFile = open(jsonlPath, mode = 'w', encoding = 'utf-8')
+            self.files.append(self.jsonlFile)
 
-import csv
+    def write(self, records):
+        # Overlapping searches can return the same person; keep the first copy only
+        with self.lock:
+            for record in records:
+                if record.key() in self.seen:
+                    continue
+                self.seen.add(record.key())
+                self.count += 1
+                if self.csvWriter:
+                    self.csvWriter.writerow(astuple(record))
+                if self.jsonlFile:
+                    self.jsonlFile.write(json.dumps(asdict(record), ensure_ascii = False) + '\n')
+            for file in self.files:
+                file.flush()
+
+    def close(self):
+        for file in self.files:
+            file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def parsePrefix(soup):
+    """Returns (numResults, surplusResults, listings) for one loaded prefix page"""
+    resultsText = soup.find(id = 'results-people-header').text
+
+    numResults = int(resultsText.split(' ')[0]) if resultsText.split(' ')[0].isdigit() else 1 if 'display: none' in soup.find(id = 'bps-result-region')['style'].split(';') else 0
+
+    surplusResults = numResults != 1 and 'display: block' in soup.find(id = 'bps-result-region').find('div', class_ = 'directory_results_warning')['style'].split(';')
+
+    listings = [] if surplusResults else soup.find_all("article", class_ = "directory_item")[0:numResults]
+    return numResults, surplusResults, listings
+
+def newDriver():
+    driver = webdriver.Chrome()
+    # Leave headroom over getSite's own in-page timeout
+    driver.set_script_timeout(5)
+    return driver
+
+def crawlPrefixes(drivers, index, prefixes, writer, waitTimes, unsearched, display = False):
+    """Worker loop: searches (prefix, attempt) items from the queue with drivers[index] until it receives None"""
+    while True:
+        item = prefixes.get()
+        try:
+            if item is None:
+                return
+            prefix, attempt = item
+            url = getURL(prefix)
+            with scraper_trace.phase(url, "render"):
+                site, waitTimes[prefix] = getSite(drivers[index], prefix)
+            with scraper_trace.phase(url, "parse"):
+                soup = getSoup(site)
+            with scraper_trace.phase(url, "extract"):
+                numResults, surplusResults, listings = parsePrefix(soup)
+                records = [extractRecord(listing) for listing in listings]
+            # Records hold plain strings, so the page's tree can go right away
+            soup.decompose()
+
+            if(display):
+                if(numResults == 25):
+                    print(f'Searching "{prefix}"... Found {numResults} results')
+
+            #Handle surplus results by queueing every longer prefix
+            if(surplusResults):
+                for c in ascii_lowercase:
+                    prefixes.put((prefix + c, 1))
+            else:
+                writer.write(records)
+        except Exception as e:
+            # A failed search loses the prefix's whole subtree, so try it again
+            # (on whichever driver is free) before giving up on it
+            if attempt < MAX_PREFIX_ATTEMPTS:
+                print(f'Error searching "{prefix}" (attempt {attempt}), retrying: {e}')
+                prefixes.put((prefix, attempt + 1))
+            else:
+                print(f'Error searching "{prefix}", giving up after {attempt} attempts: {e}')
+                unsearched.append(prefix)
+            if isinstance(e, WebDriverException):
+                restartDriver(drivers, index)
+        finally:
+            prefixes.task_done()
+
+def restartDriver(drivers, index):
+    """Replace a browser that may have crashed; keeps the old one if no new one starts"""
+    try:
+        driver = newDriver()
+    except Exception as e:
+        print(f'Could not restart browser {index}: {e}')
+        return
+    try:
+        drivers[index].quit()
+    except Exception:
+        pass
+    drivers[index] = driver
+
+def addListings(writer, nameStr = '', startChar = 'a', endChar = 'c', display = False, numDrivers = NUM_DRIVERS):
+    """Crawls names starting with nameStr + startChar..endChar, streaming records to writer.
+    Returns the prefixes that still failed after MAX_PREFIX_ATTEMPTS; names under them are missing."""
+    prefixes = queue.Queue()
+    for c in ascii_lowercase[ascii_lowercase.index(startChar):(ascii_lowercase.index(endChar) + 1)]:
+        prefixes.put((nameStr + c, 1))
 
-def saveListingsToCSV(listings, filename='listings.csv'):
-    with open(filename, mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow(['Listing Name'])  # Header row
-        for listing in listings:
-            writer.writerow([listing])
+    waitTimes = {}
+    unsearched = []
+    drivers = [newDriver() for _ in range(max(1, numDrivers))]
+    workers = [threading.Thread(target = crawlPrefixes, args = (drivers, i, prefixes, writer, waitTimes, unsearched, display)) for i in range(len(drivers))]
+    try:
+        for worker in workers:
+            worker.start()
+        prefixes.join()
+    finally:
+        for _ in workers:
+            prefixes.put(None)
+        for worker in workers:
+            worker.join()
+        for driver in drivers:
+            driver.quit()
 
+    if waitTimes:
+        waits = sorted(waitTimes.values())
+        print(f'Waited for results on {len(waits)} searches: '
+              f'mean {sum(waits) / len(waits):.3f}s, max {waits[-1]:.3f}s')
+    return sorted(unsearched)
 
-# Collect listings
-myListings = []
-addListings(myListings)
+def getListings(csvPath = 'listings.csv', jsonlPath = None, startChar = 'a', endChar = 'z', display = False):
+    """Returns (records written, prefixes that could not be searched)"""
+    with ListingWriter(csvPath, jsonlPath) as writer:
+        unsearched = addListings(writer, startChar = startChar, endChar = endChar, display = display)
+    return writer.count, unsearched
 
-# Save to CSV
-saveListingsToCSV(myListings)
 
-# Output the total number of listings found
-print(f'Total listings found: {len(myListings)}')
+if __name__ == "__main__":
+    # Records are written as each prefix finishes (addListings closes its Selenium drivers when done)
+    with ListingWriter('listings.csv', 'listings.jsonl') as writer:
+        unsearched = addListings(writer)
 
-# Close the Selenium driver
-driver.quit()
+    # Output the total number of listings found
+    print(f'Total listings found: {writer.count}')
+    if unsearched:
+        sys.exit(f'Incomplete: {len(unsearched)} prefixes could not be searched, so names starting '
+                 f'with them are missing: {", ".join(unsearched)}')
 
 #5620
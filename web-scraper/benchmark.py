@@ -0,0 +1,302 @@
+"""
+Offline benchmark for the scrapers in this folder and the Scrapling bridge's
+block detection, replaying recorded pages instead of hitting Yale sites.
+
+Fixtures are a disk cache directory as written by scraper_http.DiskCache (each
+entry's .json names the URL it was fetched from). Record them once by running
+the scrapers with the cache on, then copy .http_cache somewhere stable so TTL
+expiry and eviction cannot change them between runs.
+
+Every target runs in its own child process with the cache and rate limits off.
+Its session is routed to a loopback HTTP server that answers each URL with its
+recorded body, or 404 if it was never recorded (reported as "missing"). The
+results are printed as JSON, and written to --output if given:
+
+    pages            responses received per run (including 404s)
+    pagesPerSecond   from the fastest of --repeat runs
+    parseMsPerPage   time spent in make_soup (for the bridge, in blocked_reason),
+                     averaged over pages
+    peakRssBytes     the child's peak resident set size
+
+    python benchmark.py [--fixtures DIR] [--targets history,physics,medicine,bridge]
+                        [--repeat 3] [--workers N] [--output results.json]
+"""
+
+import argparse
+import contextlib
+import glob
+import http.server
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote, unquote
+
+from requests.adapters import HTTPAdapter
+
+from scraper_parse import make_soup
+
+TARGETS = ("history", "physics", "medicine", "bridge")
+BRIDGE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "server", "src", "scrapers"
+)
+
+
+def load_fixtures(directory):
+    """url -> (body, content type) for every complete entry in a DiskCache directory."""
+    fixtures = {}
+    for meta_path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(meta_path[: -len(".json")] + ".body", "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            continue
+        if isinstance(meta, dict) and meta.get("url"):
+            fixtures[meta["url"]] = (body, meta.get("content_type") or "text/html")
+    return fixtures
+
+
+def replay_server(fixtures):
+    """A keep-alive loopback server answering GET /<quoted url> from `fixtures`."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            fixture = fixtures.get(unquote(self.path[1:]))
+            body, content_type = fixture or (b"not recorded", "text/plain")
+            self.send_response(200 if fixture else 404)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class ReplayAdapter(HTTPAdapter):
+    """Sends every request to the replay server, keeping the original URL on the response."""
+
+    def __init__(self, origin, stats, **kwargs):
+        super().__init__(**kwargs)
+        self.origin = origin
+        self.stats = stats
+
+    def send(self, request, **kwargs):
+        url = request.url
+        request.url = f"{self.origin}/{quote(url, safe='')}"
+        response = super().send(request, **kwargs)
+        response.url = url
+        self.stats.count(response.status_code)
+        return response
+
+
+class RunStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pages = 0
+        self.missing = 0
+        self.parse_seconds = 0.0
+
+    def count(self, status):
+        with self.lock:
+            self.pages += 1
+            self.missing += status == 404
+
+    def timed(self, parse):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return parse(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                with self.lock:
+                    self.parse_seconds += elapsed
+        return wrapper
+
+
+def replay(session, origin, stats):
+    adapter = ReplayAdapter(origin, stats, pool_maxsize=64)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# --- Targets: each runs one full scrape against the replay server ---
+
+def run_history(origin, stats, workers):
+    import History_WebScraper as history
+
+    workers = workers or history.WORKERS
+    history.configure_http(workers, rate=0)
+    history.cache = None
+    replay(history.session, origin, stats)
+    history.make_soup = stats.timed(make_soup)
+    history.scrape_all(workers, incremental=False)
+
+
+def run_physics(origin, stats, workers):
+    import testscrape as physics
+
+    workers = workers or physics.WORKERS
+    physics.configure_http(workers, rate=0)
+    physics.cache = None
+    replay(physics.session, origin, stats)
+    physics.make_soup = stats.timed(make_soup)
+    physics.main(workers)
+
+
+def run_medicine(origin, stats, workers):
+    import webscraper_MED as medicine
+    from scraper_http import HostRateLimiter, make_session
+
+    workers = workers or medicine.WORKERS
+    medicine.session = replay(make_session(medicine.headers, pool_size=workers), origin, stats)
+    medicine.limiter = HostRateLimiter(0)
+    medicine.cache = None
+    medicine._pages.clear()
+    medicine.make_soup = stats.timed(make_soup)
+    lab_links = medicine.load_lab_links()
+    medicine.scrape_labs(lab_links, workers)
+    medicine.write_output(lab_links)
+
+
+def run_bridge(pages, stats):
+    sys.path.insert(0, BRIDGE_DIR)
+    from scraplingBridge import blocked_reason
+
+    # No fetching here: the bridge's block detection over every recorded page.
+    for html in pages:
+        started = time.perf_counter()
+        blocked_reason(html, 200)
+        stats.parse_seconds += time.perf_counter() - started
+        stats.pages += 1
+
+
+def peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_child(target, origin, fixtures_dir, repeat, workers):
+    """Run one target `repeat` times in this process and return its results."""
+    home = os.getcwd()
+    if target == "bridge":
+        pages = [body.decode("utf-8", errors="replace")
+                 for body, _ in load_fixtures(fixtures_dir).values()]
+    runs = []
+    for _ in range(repeat):
+        stats = RunStats()
+        with tempfile.TemporaryDirectory() as scratch, contextlib.redirect_stdout(io.StringIO()):
+            # The scrapers write their output files to the working directory.
+            os.chdir(scratch)
+            try:
+                started = time.perf_counter()
+                if target == "bridge":
+                    run_bridge(pages, stats)
+                else:
+                    globals()[f"run_{target}"](origin, stats, workers)
+                seconds = time.perf_counter() - started
+            finally:
+                os.chdir(home)
+        runs.append((seconds, stats))
+
+    seconds = [run[0] for run in runs]
+    best, stats = min(runs, key=lambda run: run[0])
+    return {
+        "pages": stats.pages,
+        "missing": stats.missing,
+        "seconds": [round(s, 4) for s in seconds],
+        "medianSeconds": round(statistics.median(seconds), 4),
+        "pagesPerSecond": round(stats.pages / best, 2) if best else None,
+        "parseMsPerPage": round(stats.parse_seconds * 1000 / stats.pages, 3) if stats.pages else None,
+        "peakRssBytes": peak_rss_bytes(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixtures", default=".http_cache",
+                        help="DiskCache directory holding the recorded pages")
+    parser.add_argument("--targets", default=",".join(TARGETS),
+                        help="comma-separated subset of " + ", ".join(TARGETS))
+    parser.add_argument("--repeat", type=int, default=3, help="runs per target")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="override each scraper's worker count")
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--origin", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    fixtures_dir = os.path.abspath(args.fixtures)
+
+    if args.child:
+        result = run_child(args.child, args.origin, fixtures_dir, max(1, args.repeat), args.workers)
+        print(json.dumps(result))
+        return 0
+
+    targets = [target.strip() for target in args.targets.split(",") if target.strip()]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+    fixtures = load_fixtures(fixtures_dir)
+    if not fixtures:
+        print(f"No recorded pages in {fixtures_dir}; run the scrapers with the disk cache on first.")
+        return 2
+
+    server = replay_server(fixtures)
+    origin = f"http://127.0.0.1:{server.server_address[1]}"
+    # Children must neither read nor write a cache of their own.
+    env = {**os.environ, "SCRAPER_CACHE_DIR": ""}
+    results = {
+        "fixtures": fixtures_dir,
+        "recordedPages": len(fixtures),
+        "repeat": max(1, args.repeat),
+        "workers": args.workers,
+        "python": sys.version.split()[0],
+        "targets": {},
+    }
+    try:
+        for target in targets:
+            command = [
+                sys.executable, os.path.abspath(__file__), "--child", target, "--origin", origin,
+                "--fixtures", fixtures_dir, "--repeat", str(results["repeat"]),
+            ]
+            if args.workers:
+                command += ["--workers", str(args.workers)]
+            child = subprocess.run(command, env=env, capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+            if child.returncode != 0:
+                lines = child.stderr.strip().splitlines() or [f"exit status {child.returncode}"]
+                results["targets"][target] = {"error": lines[-1]}
+                continue
+            results["targets"][target] = json.loads(child.stdout.strip().splitlines()[-1])
+    finally:
+        server.shutdown()
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 0 if all("error" not in result for result in results["targets"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
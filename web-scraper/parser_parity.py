@@ -0,0 +1,131 @@
+"""
+Checks that every HTML parser backend in scraper_parse.py extracts exactly the
+same records from a restricted parse (the `only` selectors) as from a full
+parse, and as a full html.parser parse, and reports how long each one took.
+
+Runs offline over saved pages: by default the pages in parity_fixtures/ plus
+the bodies in the scrapers' disk cache (.http_cache/*.body) when there is one,
+or any HTML files/directories given on the command line. Exits non-zero if any
+backend disagrees with the baseline.
+
+    python parser_parity.py [--parsers html.parser,lxml,selectolax] [PATH ...]
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+
+import scraper_parse
+from scraper_parse import PARSERS, make_soup
+
+import History_WebScraper as history
+import testscrape as physics
+import webscraper_MED as medicine
+
+LAB_URL = "https://medicine.yale.edu/lab/example"
+# Hand-saved pages covering each branch of the extractors
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parity_fixtures")
+
+# name -> extractor taking page HTML; each parses the way its scraper does.
+EXTRACTORS = {
+    "history.faculty_rows": lambda html: history.parse_faculty_rows(
+        make_soup(html, history.LIST_ONLY)),
+    "history.bio": lambda html: history.parse_bio(make_soup(html, history.PROFILE_ONLY)),
+    "medicine.lab_links": lambda html: medicine.parse_lab_links(
+        make_soup(html, medicine.INDEX_ONLY)),
+    "medicine.lab_bio": lambda html: medicine.extract_lab_bio(
+        LAB_URL, make_soup(html, medicine.LAB_ONLY)),
+    "medicine.publications_page": lambda html: medicine.find_publications_page(
+        LAB_URL, make_soup(html, medicine.LAB_ONLY)),
+    "medicine.publications": medicine.parse_publications,
+    "physics.people": lambda html: physics.parse_people(make_soup(html, physics.PEOPLE_ONLY)),
+    "physics.profile_bio": lambda html: physics.parse_profile_bio(
+        make_soup(html, physics.PROFILE_ONLY)),
+    "physics.website_text": lambda html: physics.parse_website_text(
+        make_soup(html, physics.WEBSITE_ONLY)),
+}
+
+
+def find_pages(paths):
+    pages = []
+    for path in paths:
+        if os.path.isdir(path):
+            pages.extend(sorted(
+                glob.glob(os.path.join(path, "*.body")) + glob.glob(os.path.join(path, "*.html"))
+            ))
+        else:
+            pages.append(path)
+    return pages
+
+
+def extract_all(pages, parser, restrict):
+    """Records for every (page, extractor) pair, plus the seconds spent."""
+    scraper_parse.PARSER = parser
+    scraper_parse.RESTRICT = restrict
+    records = {}
+    started = time.perf_counter()
+    for page, html in pages:
+        for name, extract in EXTRACTORS.items():
+            try:
+                # Extractors log warnings on pages not meant for them; keep them quiet.
+                with contextlib.redirect_stdout(io.StringIO()):
+                    records[page, name] = extract(html)
+            except Exception as e:
+                records[page, name] = f"<error: {type(e).__name__}: {e}>"
+    return records, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="*",
+                        help="HTML files or directories (default: parity_fixtures and .http_cache)")
+    parser.add_argument("--parsers", default=",".join(PARSERS),
+                        help="comma-separated backends to compare")
+    args = parser.parse_args()
+
+    pages = []
+    paths = args.paths or [path for path in (FIXTURES_DIR, ".http_cache") if os.path.isdir(path)]
+    for path in find_pages(paths):
+        with open(path, "rb") as f:
+            pages.append((path, f.read().decode("utf-8", errors="replace")))
+    if not pages:
+        print("No pages found; run a scraper with the disk cache enabled first.")
+        return 2
+
+    baseline, baseline_s = extract_all(pages, "html.parser", restrict=False)
+    print(f"{len(pages)} pages x {len(EXTRACTORS)} extractors")
+    print(f"  {'baseline (full html.parser)':<28} {baseline_s:8.3f}s")
+
+    failed = False
+    for backend in args.parsers.split(","):
+        if not scraper_parse.available(backend):
+            print(f"  {backend:<28} skipped (not installed)")
+            continue
+        records, seconds = extract_all(pages, backend, restrict=True)
+        full, _ = extract_all(pages, backend, restrict=False)
+        # A restricted parse must match the same backend's full parse; the
+        # backend itself may still build a different tree from html.parser on
+        # malformed markup (lxml closes an unclosed <p> at the next block).
+        checks = [
+            ("restricted", [key for key in full if records[key] != full[key]]),
+            ("vs html.parser", [key for key in baseline if records[key] != baseline[key]]),
+        ]
+        status = ", ".join(
+            f"{check}: " + ("ok" if not mismatches else f"{len(mismatches)} MISMATCHES")
+            for check, mismatches in checks
+        )
+        print(f"  {backend:<28} {seconds:8.3f}s  {baseline_s / seconds:5.2f}x  {status}")
+        for check, mismatches in checks:
+            for page, name in mismatches[:5]:
+                print(f"    {check}: {name} differs on {page}")
+            failed = failed or bool(mismatches)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
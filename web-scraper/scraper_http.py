@@ -0,0 +1,487 @@
+import email.utils
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timezone
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import scraper_trace
+
+# Shared HTTP plumbing for the scrapers in this folder: one pooled session per
+# run, a per-host token bucket so concurrent workers stay polite, per-host
+# health tracking that backs off and stops calling failing hosts, and an
+# on-disk cache that turns reruns into conditional GETs.
+
+CACHE_DIR = os.environ.get("SCRAPER_CACHE_DIR", ".http_cache")
+CACHE_TTL = float(os.environ.get("SCRAPER_CACHE_TTL", 12 * 60 * 60))
+CACHE_MAX_BYTES = int(float(os.environ.get("SCRAPER_CACHE_MAX_MB", 512)) * 1024 * 1024)
+
+# Responses fetched with max_bytes must be one of these (or untyped) and not
+# look binary; anything else raises SkippedContent before the body is read.
+TEXT_CONTENT_TYPES = frozenset({
+    "text/html", "application/xhtml+xml", "text/plain", "text/xml", "application/xml",
+})
+
+
+# Responses that mean "slow down" rather than "this host is broken".
+BACKOFF_STATUSES = frozenset({429, 503})
+
+
+class SkippedContent(Exception):
+    """A bounded fetch refused a PDF, image or other non-text response."""
+
+
+class HostUnavailable(Exception):
+    """The host's circuit is open, so the request was skipped without being sent."""
+
+
+class TokenBucket:
+    """Allows `rate` requests per second with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Reserve the token now; callers sleep off any debt outside the lock.
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """One token bucket per host, created on first use.
+
+    Pacing per host lets workers fetching different sites proceed in
+    parallel, and cached_get only waits on it for real requests, so cached
+    reruns are not slowed down.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(self.rate, self.burst)
+        bucket.acquire()
+
+
+def retry_after_seconds(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, when.timestamp() - time.time())
+
+
+class HostState:
+    def __init__(self, limit):
+        self.limit = float(limit)   # requests allowed in flight (AIMD)
+        self.delay = 0.0            # seconds between request starts (AIMD)
+        self.in_flight = 0
+        self.next_at = 0.0          # monotonic time the next request may start
+        self.open_until = None      # monotonic time the open circuit may be probed
+        self.probing = False
+        self.failures = 0           # consecutive
+        self.requests = 0
+        self.errors = 0
+        self.skipped = 0
+        self.backoffs = 0
+        self.latency = None         # moving average of successful response times
+        self.error_rate = 0.0       # moving average of failures
+
+
+class HostHealth:
+    """Per-host latency and error tracking with adaptive pacing and a circuit breaker.
+
+    Each host starts with `max_concurrency` requests allowed in flight. A 429
+    or 503 halves that and doubles the delay between requests, and any
+    Retry-After is honored; each success adds back 1/limit of a slot and
+    trims `delay_step` off the delay. `failure_threshold` failures in a row
+    (connection errors and 5xx alike) open the host's circuit: its requests
+    raise HostUnavailable without being sent until `cooldown` seconds pass,
+    then a single probe decides whether it closes again. Callers must treat
+    HostUnavailable as "not fetched", never as "not there".
+    """
+
+    SMOOTHING = 0.2
+
+    def __init__(self, max_concurrency=8, failure_threshold=3, cooldown=60.0,
+                 max_delay=30.0, delay_step=0.1, retries=2):
+        self.max_concurrency = max(1, max_concurrency)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_delay = max_delay
+        self.delay_step = delay_step
+        self.retries = retries
+        self.hosts = {}
+        self.condition = threading.Condition()
+
+    def acquire(self, url):
+        """Wait for a slot on the URL's host, or raise HostUnavailable if its circuit is open."""
+        host = urlsplit(url).netloc.lower()
+        with self.condition:
+            state = self.hosts.get(host)
+            if state is None:
+                state = self.hosts[host] = HostState(self.max_concurrency)
+            while True:
+                now = time.monotonic()
+                if state.open_until is not None:
+                    if now < state.open_until or state.probing:
+                        state.skipped += 1
+                        raise HostUnavailable(f"{host} is failing; skipped {url}")
+                    # Cooldown over: this request is the half-open probe.
+                    state.probing = True
+                    break
+                if state.in_flight < max(1, int(state.limit)):
+                    break
+                self.condition.wait()
+            start = max(now, state.next_at)
+            state.next_at = start + state.delay
+            state.in_flight += 1
+        if start > now:
+            time.sleep(start - now)
+
+    def release(self, url, status=None, elapsed=None, error=None, retry_after=None):
+        """Record the outcome of a request started with acquire()."""
+        host = urlsplit(url).netloc.lower()
+        now = time.monotonic()
+        with self.condition:
+            state = self.hosts[host]
+            state.in_flight -= 1
+            state.requests += 1
+            failed = error is not None or (
+                status is not None and status >= 500 and status not in BACKOFF_STATUSES
+            )
+            state.error_rate += self.SMOOTHING * (failed - state.error_rate)
+
+            if status in BACKOFF_STATUSES:
+                state.backoffs += 1
+                state.limit = max(1.0, state.limit / 2)
+                state.delay = min(self.max_delay, max(1.0, state.delay * 2))
+                if retry_after is not None and retry_after > self.max_delay:
+                    state.open_until = now + retry_after
+                else:
+                    state.next_at = max(state.next_at, now + (retry_after or state.delay))
+            elif failed:
+                state.errors += 1
+                state.failures += 1
+                if state.probing or state.failures >= self.failure_threshold:
+                    state.open_until = now + self.cooldown
+            else:
+                state.failures = 0
+                state.open_until = None
+                state.limit = min(self.max_concurrency, state.limit + 1 / state.limit)
+                state.delay = max(0.0, state.delay - self.delay_step)
+                if elapsed is not None:
+                    state.latency = elapsed if state.latency is None else (
+                        state.latency + self.SMOOTHING * (elapsed - state.latency))
+            state.probing = False
+            self.condition.notify_all()
+
+    def print_summary(self):
+        """Print the hosts that failed, were skipped or were slowed down during the run."""
+        with self.condition:
+            troubled = sorted(
+                ((host, state) for host, state in self.hosts.items()
+                 if state.errors or state.skipped or state.backoffs),
+                key=lambda item: -(item[1].skipped + item[1].errors),
+            )
+        if not troubled:
+            return
+        print(f"\n{len(troubled)} hosts had trouble:")
+        for host, state in troubled:
+            latency = f"{state.latency:.2f}s" if state.latency is not None else "-"
+            circuit = "open" if state.open_until is not None else "closed"
+            print(f"  {host}: {state.requests} requests, {state.errors} errors, "
+                  f"{state.skipped} skipped, {state.backoffs} backoffs, latency {latency}, "
+                  f"error rate {state.error_rate:.0%}, circuit {circuit}")
+
+
+def normalize_url(url):
+    """Canonical form for memo keys: lower-case scheme/host, no fragment or trailing slash."""
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+
+class TracedAdapter(HTTPAdapter):
+    """HTTPAdapter that records ttfb, download, status and size on the URL's trace span."""
+
+    def send(self, request, stream=False, **kwargs):
+        url = scraper_trace.current_url() or request.url
+        scraper_trace.count_request(url)
+        with scraper_trace.fetching(url):
+            setup_before = scraper_trace.setup_ms()
+            started = time.perf_counter()
+            try:
+                response = super().send(request, stream=stream, **kwargs)
+            except Exception as e:
+                scraper_trace.note(url, error=type(e).__name__)
+                raise
+            elapsed = (time.perf_counter() - started) * 1000
+            scraper_trace.add(url, "ttfb", elapsed - (scraper_trace.setup_ms() - setup_before))
+        scraper_trace.note(url, status=response.status_code)
+        if not stream:
+            # Streamed bodies are read (and timed) by bounded_get.
+            with scraper_trace.phase(url, "download"):
+                scraper_trace.note(url, bytes=len(response.content))
+        return response
+
+
+def make_session(headers, pool_size=10, host_pools=None):
+    """A requests.Session whose connection pool can serve `pool_size` threads per host.
+
+    `host_pools` is how many hosts keep their keep-alive connections at once
+    (default `pool_size`); raise it when fanning out over many sites.
+    """
+    session = requests.Session()
+    session.headers.update(headers)
+    adapter_class = TracedAdapter if scraper_trace.ENABLED else HTTPAdapter
+    adapter = adapter_class(pool_connections=host_pools or pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class DiskCache:
+    """URL-keyed response cache with ETag/Last-Modified revalidation.
+
+    Entries younger than `ttl` seconds are served without touching the
+    network; older ones are revalidated with If-None-Match/If-Modified-Since
+    and a 304 refreshes them in place. Least recently used entries are
+    evicted once the bodies exceed `max_bytes`.
+    """
+
+    def __init__(self, directory=CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(
+            entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith(".body")
+        )
+
+    @classmethod
+    def from_env(cls):
+        """The cache configured by SCRAPER_CACHE_*; SCRAPER_CACHE_DIR="" disables it."""
+        return cls() if CACHE_DIR else None
+
+    def get(self, session, url, limiter=None, max_bytes=None, health=None, **kwargs):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        meta = self._load(key)
+        if meta and time.time() - meta["fetched_at"] < self.ttl:
+            scraper_trace.note(url, cached=True)
+            return self._response(key, meta, url)
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        response = polite_get(session, url, limiter, health, max_bytes, headers=headers, **kwargs)
+
+        if response.status_code == 304 and meta:
+            meta["fetched_at"] = time.time()
+            meta["etag"] = response.headers.get("ETag", meta.get("etag"))
+            meta["last_modified"] = response.headers.get("Last-Modified", meta.get("last_modified"))
+            self._write(key + ".json", json.dumps(meta).encode("utf-8"))
+            scraper_trace.note(url, cached=True)
+            return self._response(key, meta, url)
+        if response.status_code == 200:
+            self._store(key, url, response)
+            response.from_cache = False
+        return response
+
+    def _load(self, key):
+        try:
+            with open(self._path(key + ".json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            os.utime(self._path(key + ".body"))  # mark as recently used for eviction
+            return meta
+        except (OSError, ValueError):
+            return None
+
+    def _response(self, key, meta, url):
+        try:
+            with open(self._path(key + ".body"), "rb") as f:
+                body = f.read()
+        except OSError:
+            body = b""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = body
+        response.encoding = meta.get("encoding")
+        response.headers["Content-Type"] = meta.get("content_type") or ""
+        for header, field in (("ETag", "etag"), ("Last-Modified", "last_modified")):
+            if meta.get(field):
+                response.headers[header] = meta[field]
+        response.from_cache = True
+        return response
+
+    def _store(self, key, url, response):
+        body = response.content
+        meta = {
+            "url": url,
+            "fetched_at": time.time(),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "encoding": response.encoding,
+            "content_type": response.headers.get("Content-Type"),
+        }
+        path = self._path(key + ".body")
+        previous = os.path.getsize(path) if os.path.exists(path) else 0
+        self._write(key + ".body", body)
+        self._write(key + ".json", json.dumps(meta).encode("utf-8"))
+        with self.lock:
+            self.total_bytes += len(body) - previous
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        bodies = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".body")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in bodies:
+            if self.total_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                os.remove(entry.path[: -len(".body")] + ".json")
+            except OSError:
+                continue
+            self.total_bytes -= size
+
+    def _write(self, name, data):
+        # Write-then-rename so a concurrent reader never sees a partial entry.
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._path(name))
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+
+def bounded_get(session, url, max_bytes=None, **kwargs):
+    """session.get(url), reading at most `max_bytes` of a text response.
+
+    With max_bytes set, the body is streamed and the connection dropped once
+    the limit is reached, and non-text responses raise SkippedContent
+    without being downloaded. Use it for sites outside our control (lab and
+    personal pages), together with scraper_parse.bounded_text to stop
+    extracting text past a budget.
+    """
+    if max_bytes is None:
+        return session.get(url, **kwargs)
+    response = session.get(url, stream=True, **kwargs)
+    if response.status_code != 200:
+        response.close()
+        return response
+    content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    if content_type and content_type not in TEXT_CONTENT_TYPES:
+        response.close()
+        raise SkippedContent(f"{content_type} response from {url}")
+
+    chunks = []
+    size = 0
+    try:
+        with scraper_trace.phase(url, "download"):
+            for chunk in response.iter_content(64 * 1024):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= max_bytes:
+                    break
+    finally:
+        response.close()
+    body = b"".join(chunks)[:max_bytes]
+    scraper_trace.note(url, bytes=len(body))
+    # Untyped or mislabeled downloads: PDFs and files with NUL bytes are not pages.
+    if body.startswith(b"%PDF-") or b"\0" in body[:1024]:
+        raise SkippedContent(f"binary response from {url}")
+    response._content = body
+    return response
+
+
+def polite_get(session, url, limiter=None, health=None, max_bytes=None, **kwargs):
+    """bounded_get(session, url) paced by `limiter` and gated by `health`.
+
+    With a HostHealth, 429/503 responses are retried up to health.retries
+    times after the backoff it imposes, and HostUnavailable is raised
+    instead of calling a host whose circuit is open.
+    """
+    attempts = 1 + (health.retries if health is not None else 0)
+    for attempt in range(attempts):
+        if health is not None:
+            try:
+                health.acquire(url)
+            except HostUnavailable:
+                scraper_trace.note(url, error="HostUnavailable")
+                raise
+        if limiter is not None:
+            limiter.wait(url)
+        if health is None:
+            return bounded_get(session, url, max_bytes, **kwargs)
+
+        started = time.monotonic()
+        try:
+            response = bounded_get(session, url, max_bytes, **kwargs)
+        except SkippedContent:
+            health.release(url, status=200, elapsed=time.monotonic() - started)
+            raise
+        except Exception as e:
+            health.release(url, error=e)
+            raise
+        health.release(url, status=response.status_code, elapsed=time.monotonic() - started,
+                       retry_after=retry_after_seconds(response.headers.get("Retry-After")))
+        if response.status_code not in BACKOFF_STATUSES or attempt == attempts - 1:
+            return response
+        response.close()
+
+
+def cached_get(session, url, cache=None, limiter=None, max_bytes=None, health=None, **kwargs):
+    """session.get(url) routed through `cache` when one is configured.
+
+    The limiter and host health are only consulted when a request actually
+    goes out, so fresh cache hits are free. See bounded_get for `max_bytes`
+    and polite_get for `health`.
+    """
+    with scraper_trace.fetching(url):
+        if cache is not None:
+            return cache.get(session, url, limiter=limiter, max_bytes=max_bytes, health=health,
+                             **kwargs)
+        return polite_get(session, url, limiter, health, max_bytes, **kwargs)
@@ -0,0 +1,161 @@
+import os
+import re
+import warnings
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+# Pluggable HTML parsing for the scrapers in this folder. SCRAPER_PARSER picks
+# the backend:
+#   html.parser  stdlib, the default
+#   lxml         BeautifulSoup's lxml builder
+#   selectolax   lexbor finds the `only` subtrees, which are handed to
+#                html.parser as fragments
+# `only` is a comma-separated list of simple selectors ("tr", "li, p",
+# "table.views-table", "a[href]") naming the subtrees an extractor reads;
+# everything else is skipped at parse time. Extractors must only look inside
+# those subtrees.
+# SCRAPER_PARSE_ONLY=0 turns the restriction off. parser_parity.py checks
+# that every backend yields the same records as a full html.parser parse.
+
+PARSERS = ("html.parser", "lxml", "selectolax")
+PARSER = os.environ.get("SCRAPER_PARSER", "html.parser")
+RESTRICT = os.environ.get("SCRAPER_PARSE_ONLY", "1") != "0"
+
+
+def parse_selectors(only):
+    """'div.a, a[href]' -> [("div", "a", None), ("a", None, "href")]: tag, class, required attribute."""
+    selectors = []
+    for part in only.split(","):
+        part, _, attr = part.strip().rstrip("]").partition("[")
+        tag, _, cls = part.partition(".")
+        selectors.append((tag, cls or None, attr or None))
+    return selectors
+
+
+class _SelectorStrainer(SoupStrainer):
+    """Keeps tags matching any selector in a list mixing tags, classes and attributes."""
+
+    def __init__(self, selectors):
+        super().__init__()
+        self.selectors = selectors
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        attrs = attrs or {}
+        words = (attrs.get("class") or "").split()
+        return any(
+            name == tag and (cls is None or cls in words) and (attr is None or attr in attrs)
+            for tag, cls, attr in self.selectors
+        )
+
+
+def soup_strainer(only):
+    """The SoupStrainer for `only`."""
+    selectors = parse_selectors(only)
+    tags = [tag for tag, _, _ in selectors]
+    classes = [cls for _, cls, _ in selectors if cls]
+    attributes = any(attr for _, _, attr in selectors)
+    if not classes and not attributes:
+        return SoupStrainer(tags if len(tags) > 1 else tags[0])
+    if not attributes and len(set(tags)) == 1 and len(classes) == len(selectors):
+        # While parsing, class is still the raw attribute string ("field field-item
+        # even"), so match whole words in it rather than the string itself.
+        words = "|".join(re.escape(cls) for cls in classes)
+        return SoupStrainer(tags[0], class_=re.compile(rf"(?:^|\s)(?:{words})(?:\s|$)"))
+    # Anything else ("div.wysiwyg, p, a[href]") cannot be written as one
+    # SoupStrainer's rules. Before Beautiful Soup 4.13 allow_tag_creation is never
+    # called and this keeps every tag, i.e. an unrestricted parse.
+    return _SelectorStrainer(selectors)
+
+
+class _RestrictedSoup(BeautifulSoup):
+    """A parse_only soup whose kept elements still end where they would in a full parse.
+
+    A skipped element's end tag would be ignored, so a kept element left open
+    inside it (<td><p>text</td>, common on hand-written lab pages) would swallow
+    everything up to the next kept end tag. Tags are only skipped at the top
+    level, so any kept element still open is younger than every skipped one.
+    """
+
+    def reset(self):
+        super().reset()
+        self._skipped = []
+
+    def handle_starttag(self, name, *args, **kwargs):
+        top_level = len(self.tagStack) <= 1
+        tag = super().handle_starttag(name, *args, **kwargs)
+        if tag is None and top_level and not self.builder.can_be_empty_element(name):
+            self._skipped.append(name)
+        return tag
+
+    def handle_endtag(self, name, nsprefix=None):
+        if name in self._skipped and not any(tag.name == name for tag in self.tagStack[1:]):
+            self.endData()
+            while len(self.tagStack) > 1:
+                self.popTag()
+            while self._skipped.pop() != name:
+                pass
+            return
+        super().handle_endtag(name, nsprefix)
+
+
+def _selectolax_fragments(markup, only):
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(markup)
+    matched = set()
+    fragments = []
+    # css() returns nested matches too; keep only outermost ones, like SoupStrainer.
+    for node in tree.css(only):
+        matched.add(node.mem_id)
+        parent = node.parent
+        while parent is not None and parent.mem_id not in matched:
+            parent = parent.parent
+        if parent is None:
+            fragments.append(node.html)
+    return "".join(fragments)
+
+
+def available(parser):
+    module = {"lxml": "lxml", "selectolax": "selectolax"}.get(parser)
+    if module is None:
+        return parser in PARSERS
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+_warned = set()
+
+
+def make_soup(markup, only=None, parser=None):
+    """Parse `markup` with the configured backend, restricted to `only` when given."""
+    parser = parser or PARSER
+    if not available(parser):
+        if parser not in _warned:
+            _warned.add(parser)
+            warnings.warn(f"HTML parser {parser!r} is unavailable; using html.parser")
+        parser = "html.parser"
+    if not RESTRICT:
+        only = None
+
+    if parser == "selectolax":
+        if only is None:
+            return BeautifulSoup(markup, "html.parser")
+        return BeautifulSoup(_selectolax_fragments(markup, only), "html.parser")
+    if not only:
+        return BeautifulSoup(markup, parser)
+    return _RestrictedSoup(markup, parser, parse_only=soup_strainer(only))
+
+
+def bounded_text(element, limit, separator=" "):
+    """element.get_text(separator, strip=True)[:limit], without walking past the limit."""
+    parts = []
+    size = 0
+    for text in element.stripped_strings:
+        parts.append(text)
+        size += len(text) + (len(separator) if len(parts) > 1 else 0)
+        if size >= limit:
+            break
+    return separator.join(parts)[:limit]
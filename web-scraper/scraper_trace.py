@@ -0,0 +1,260 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from urllib.parse import urlsplit
+
+# Opt-in tracing for the scrapers in this folder, off unless configured:
+#   SCRAPER_TRACE=1          per-host summary table on stderr when the run ends
+#   SCRAPER_TRACE=spans.jsonl  the same, plus one JSON span per URL in that file
+#   SCRAPER_PROFILE=run.prof   cProfile of the main thread (open with pstats/snakeviz)
+#   SCRAPER_PROFILE=run.folded sampled stacks of every thread, in the collapsed
+#                              format flamegraph.pl and speedscope read
+# A span collects the time one URL spent in each of PHASES. scraper_http
+# records the network phases; scrapers wrap parsing and extraction in
+# phase(url, "parse") / phase(url, "extract").
+
+TRACE = os.environ.get("SCRAPER_TRACE", "")
+PROFILE = os.environ.get("SCRAPER_PROFILE", "")
+ENABLED = TRACE not in ("", "0")
+SAMPLE_INTERVAL = 0.005
+
+PHASES = ("dns", "connect", "ttfb", "download", "render", "parse", "extract")
+
+_spans = {}
+_lock = threading.Lock()
+_local = threading.local()
+_null = nullcontext()
+
+
+def _span(url):
+    with _lock:
+        span = _spans.get(url)
+        if span is None:
+            span = _spans[url] = {"url": url, "host": urlsplit(url).netloc.lower(), "requests": 0}
+        return span
+
+
+def add(url, name, ms):
+    if ENABLED and url:
+        span = _span(url)
+        with _lock:
+            span[name] = span.get(name, 0.0) + ms
+
+
+def note(url, **fields):
+    """Attach status, bytes, cached, error, ... to the span for `url`."""
+    if ENABLED and url:
+        span = _span(url)
+        with _lock:
+            span.update(fields)
+
+
+def phase(url, name):
+    """Context manager timing `name` for `url`; a shared no-op when tracing is off."""
+    return _timed(url, name) if ENABLED and url else _null
+
+
+@contextmanager
+def _timed(url, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(url, name, (time.perf_counter() - started) * 1000)
+
+
+def fetching(url):
+    """Context manager marking `url` as the one this thread is fetching, so connection
+    setup (DNS/connect) is charged to it."""
+    return _fetching(url) if ENABLED and url else _null
+
+
+@contextmanager
+def _fetching(url):
+    previous = getattr(_local, "url", None)
+    _local.url = url
+    try:
+        yield
+    finally:
+        _local.url = previous
+
+
+def current_url():
+    return getattr(_local, "url", None)
+
+
+def count_request(url):
+    if ENABLED and url:
+        span = _span(url)
+        with _lock:
+            span["requests"] += 1
+
+
+def setup_ms():
+    """Connection setup time (DNS + connect) this thread has spent so far."""
+    return getattr(_local, "setup_ms", 0.0)
+
+
+def _install_connection_hooks():
+    # requests does not expose DNS/connect timings, so time urllib3's
+    # connection setup and the resolver call inside it.
+    import socket
+
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+
+    getaddrinfo = socket.getaddrinfo
+
+    def traced_getaddrinfo(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return getaddrinfo(*args, **kwargs)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            _local.dns_ms = getattr(_local, "dns_ms", 0.0) + elapsed
+            add(current_url(), "dns", elapsed)
+
+    def traced(connect):
+        def wrapper(self, *args, **kwargs):
+            dns_before = getattr(_local, "dns_ms", 0.0)
+            started = time.perf_counter()
+            try:
+                return connect(self, *args, **kwargs)
+            finally:
+                elapsed = (time.perf_counter() - started) * 1000
+                _local.setup_ms = setup_ms() + elapsed
+                # TCP (and TLS) setup only; the lookup is already counted as dns.
+                add(current_url(), "connect", elapsed - (getattr(_local, "dns_ms", 0.0) - dns_before))
+        return wrapper
+
+    socket.getaddrinfo = traced_getaddrinfo
+    HTTPConnection.connect = traced(HTTPConnection.connect)
+    HTTPSConnection.connect = traced(HTTPSConnection.connect)
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+def summary_rows():
+    """One row per host: spans, errors, cache hits, mean ms per phase, p50/p95 total ms, bytes."""
+    with _lock:
+        spans = [dict(span) for span in _spans.values()]
+    hosts = {}
+    for span in spans:
+        span["total"] = sum(span.get(name, 0.0) for name in PHASES)
+        hosts.setdefault(span["host"], []).append(span)
+    rows = []
+    for host, host_spans in sorted(hosts.items(), key=lambda item: -sum(s["total"] for s in item[1])):
+        totals = [span["total"] for span in host_spans]
+        row = {
+            "host": host,
+            "urls": len(host_spans),
+            "errors": sum(1 for span in host_spans
+                          if span.get("error") or (span.get("status") or 0) >= 400),
+            "cached": sum(1 for span in host_spans if span.get("cached")),
+            "bytes": sum(span.get("bytes", 0) for span in host_spans),
+            "p50": _percentile(totals, 0.5),
+            "p95": _percentile(totals, 0.95),
+        }
+        for name in PHASES:
+            row[name] = sum(span.get(name, 0.0) for span in host_spans) / len(host_spans)
+        rows.append(row)
+    return rows
+
+
+def print_summary(stream=None):
+    stream = stream or sys.stderr
+    rows = summary_rows()
+    if not rows:
+        return
+    # Only show phases something actually spent time in.
+    phases = [name for name in PHASES if any(row[name] for row in rows)]
+    width = max(24, max(len(row["host"]) for row in rows))
+    header = f"{'host':<{width}} {'urls':>5} {'err':>4} {'cache':>5} " + "".join(
+        f"{name:>9}" for name in phases) + f"{'p50':>9}{'p95':>9}{'MB':>8}"
+    print("\nPer-host timings (mean ms per URL)", file=stream)
+    print(header, file=stream)
+    for row in rows:
+        print(f"{row['host']:<{width}} {row['urls']:>5} {row['errors']:>4} {row['cached']:>5} "
+              + "".join(f"{row[name]:>9.1f}" for name in phases)
+              + f"{row['p50']:>9.1f}{row['p95']:>9.1f}{row['bytes'] / 1e6:>8.2f}", file=stream)
+
+
+def write_spans(path):
+    with _lock:
+        spans = list(_spans.values())
+    with open(path, "w", encoding="utf-8") as f:
+        for span in spans:
+            f.write(json.dumps(span) + "\n")
+
+
+class StackSampler:
+    """Samples every thread's Python stack; counts are written in collapsed-stack format."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts = {}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def stop(self, path):
+        self.stopped.set()
+        self.thread.join()
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+
+
+def _start_profiler():
+    if PROFILE.endswith(".folded"):
+        sampler = StackSampler()
+        sampler.start()
+        return lambda: sampler.stop(PROFILE)
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    def stop():
+        profiler.disable()
+        profiler.dump_stats(PROFILE)
+    return stop
+
+
+def _finish(stop_profiler):
+    if stop_profiler is not None:
+        stop_profiler()
+        print(f"Profile written to {PROFILE}", file=sys.stderr)
+    if ENABLED:
+        print_summary()
+        if TRACE != "1":
+            write_spans(TRACE)
+            print(f"Spans written to {TRACE}", file=sys.stderr)
+
+
+if ENABLED:
+    _install_connection_hooks()
+if ENABLED or PROFILE:
+    atexit.register(_finish, _start_profiler() if PROFILE else None)
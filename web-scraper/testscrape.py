@@ -1,121 +1,200 @@
-import requests
-from bs4 import BeautifulSoup
-import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 import json
 
-url = "https://physics.yale.edu/people"
-response = requests.get(url)
-soup = BeautifulSoup(response.text, "html.parser")
-
-faculty_data = []
-count = 0
-
-# Loop through each table row containing a listing
-for row in soup.find_all("tr"):
-    name_cell = row.find("td", class_="views-field-name")
-    if not name_cell:
-        continue  # Skip rows without a listing
-
-    # --- Name & profile link ---
-    name_tag = name_cell.find("a", class_="username")
-    name = name_tag.get_text(strip=True) if name_tag else None
-    profile_link = f"https://physics.yale.edu{name_tag['href']}" if name_tag else None
-
-    # --- Text content ---
-    text_parts = list(name_cell.stripped_strings)
-    # First entry is name
-    title = text_parts[1] if len(text_parts) > 1 else None
-    office = text_parts[2] if len(text_parts) > 2 else None
-
-    # --- Email ---
-    email_tag = name_cell.find("a", href=lambda x: x and x.startswith("mailto:"))
-    email = email_tag.get_text(strip=True) if email_tag else None
-
-    # --- Website ---
-    website_tag = name_cell.find("a", href=lambda x: x and x.startswith("http"))
-    website = website_tag['href'] if website_tag else None
-
-    # --- Phone numbers ---
-    phones = []
-    for t in text_parts:
-        # Match typical phone patterns
-        if "Phone:" in t or t.replace("-", "").strip().isdigit():
-            phones.append(t.replace("Phone:", "").strip())
-
-    # --- Picture ---
-    pic_cell = row.find("td", class_="views-field-picture")
-    img_tag = pic_cell.find("img") if pic_cell else None
-    image_url = img_tag['src'] if img_tag else None
-
-    # --- Field of study ---
-    study_cell = row.find("td", class_="views-field-field-field-of-study")
-    field_of_study = study_cell.get_text(strip=True) if study_cell else None
-
-    count += 1
+import scraper_trace
+from scraper_http import DiskCache, HostRateLimiter, SkippedContent, cached_get, make_session
+from scraper_parse import bounded_text, make_soup
+
+URL = "https://physics.yale.edu/people"
+OUTPUT_FILE = "faculty_data.json"
+
+# The only parts of each page the extractors read (see scraper_parse.py)
+PEOPLE_ONLY = "tr"
+PROFILE_ONLY = "div.field-name-field-research-narrative"
+WEBSITE_ONLY = "div.field-item"
+
+# Profile pages and personal websites are fetched by a pool of workers.
+WORKERS = 16
+REQUESTS_PER_SECOND = 4.0
+# (connect, read) seconds; a dead personal site fails fast on connect
+TIMEOUT = (5, 10)
+# Per-page limits for personal websites (see scraper_http.bounded_get)
+MAX_WEBSITE_BYTES = 2 * 1024 * 1024
+MAX_WEBSITE_CHARS = 20000
+
+# Every worker may be on physics.yale.edu at once, so each host's pool
+# holds one connection per worker.
+session = make_session({}, pool_size=WORKERS, host_pools=64)
+limiter = HostRateLimiter(REQUESTS_PER_SECOND, burst=2)
+cache = DiskCache.from_env()
+
+
+def configure_http(workers, rate):
+    global session, limiter
+    session = make_session({}, pool_size=workers, host_pools=64)
+    limiter = HostRateLimiter(rate, burst=2)
+
+
+def parse_people(soup):
+    people = []
+
+    # Loop through each table row containing a listing
+    for row in soup.find_all("tr"):
+        name_cell = row.find("td", class_="views-field-name")
+        if not name_cell:
+            continue  # Skip rows without a listing
+
+        # --- Name & profile link ---
+        name_tag = name_cell.find("a", class_="username")
+        name = name_tag.get_text(strip=True) if name_tag else None
+        profile_link = f"https://physics.yale.edu{name_tag['href']}" if name_tag else None
+
+        # --- Text content ---
+        text_parts = list(name_cell.stripped_strings)
+        # First entry is name
+        title = text_parts[1] if len(text_parts) > 1 else None
+        office = text_parts[2] if len(text_parts) > 2 else None
+
+        # --- Email ---
+        email_tag = name_cell.find("a", href=lambda x: x and x.startswith("mailto:"))
+        email = email_tag.get_text(strip=True) if email_tag else None
+
+        # --- Website ---
+        website_tag = name_cell.find("a", href=lambda x: x and x.startswith("http"))
+        website = website_tag['href'] if website_tag else None
+
+        # --- Phone numbers ---
+        phones = []
+        for t in text_parts:
+            # Match typical phone patterns
+            if "Phone:" in t or t.replace("-", "").strip().isdigit():
+                phones.append(t.replace("Phone:", "").strip())
+
+        # --- Picture ---
+        pic_cell = row.find("td", class_="views-field-picture")
+        img_tag = pic_cell.find("img") if pic_cell else None
+        image_url = img_tag['src'] if img_tag else None
+
+        # --- Field of study ---
+        study_cell = row.find("td", class_="views-field-field-field-of-study")
+        field_of_study = study_cell.get_text(strip=True) if study_cell else None
+
+        people.append({
+            "name": name,
+            "profile_link": profile_link,
+            "title": title,
+            "office": office,
+            "email": email,
+            "phones": phones,
+            "website": website,
+            "image_url": image_url,
+            "field_of_study": field_of_study,
+        })
+
+    return people
+
+
+def parse_profile_bio(profile_soup):
+    # Look for the research narrative field
+    research_field = profile_soup.find("div", class_="field-name-field-research-narrative")
+    if research_field:
+        field_item = research_field.find("div", class_="field-item even")
+        if field_item:
+            return field_item.get_text(separator=" ", strip=True)
+    return None
+
+
+def parse_website_text(website_soup):
+    # Extract text from the specific div with class "field-item even"
+    field_item = website_soup.find("div", class_="field-item even")
+    if field_item:
+        return bounded_text(field_item, MAX_WEBSITE_CHARS)
+    # Fallback: try just "field-item" or "field-items"
+    field_item = website_soup.find("div", class_="field-item")
+    if field_item:
+        return bounded_text(field_item, MAX_WEBSITE_CHARS)
+    return None
+
+
+def fetch_profile_bio(count, name, profile_link):
+    try:
+        print(f"Scraping profile page {count}: {name} - {profile_link}...")
+        profile_response = cached_get(session, profile_link, cache, limiter, timeout=TIMEOUT)
+        with scraper_trace.phase(profile_link, "parse"):
+            soup = make_soup(profile_response.text, PROFILE_ONLY)
+        with scraper_trace.phase(profile_link, "extract"):
+            return parse_profile_bio(soup)
+    except Exception as e:
+        print(f"Error scraping profile page {profile_link}: {e}")
+        return None
+
+
+def fetch_website_text(count, name, website):
+    try:
+        print(f"Scraping website {count}: {name} - {website}...")
+        website_response = cached_get(session, website, cache, limiter, MAX_WEBSITE_BYTES,
+                                      timeout=TIMEOUT)
+        with scraper_trace.phase(website, "parse"):
+            soup = make_soup(website_response.text, WEBSITE_ONLY)
+        with scraper_trace.phase(website, "extract"):
+            return parse_website_text(soup)
+    except SkippedContent as e:
+        print(f"Skipping {website}: {e}")
+        return None
+    except Exception as e:
+        print(f"Error scraping {website}: {e}")
+        return None
+
+
+def enrich(count, person):
+    """Profile bio and website text for one person (either may be None)."""
+    name = person["name"]
 
     # --- Scrape profile page for bio text ---
     profile_bio = None
-    if profile_link:
-        try:
-            print(f"Scraping profile page {count}: {name} - {profile_link}...")
-            profile_response = requests.get(profile_link, timeout=10)
-            profile_soup = BeautifulSoup(profile_response.text, "html.parser")
-
-            # Look for the research narrative field
-            research_field = profile_soup.find("div", class_="field-name-field-research-narrative")
-            if research_field:
-                field_item = research_field.find("div", class_="field-item even")
-                if field_item:
-                    profile_bio = field_item.get_text(separator=" ", strip=True)
-
-            time.sleep(0.5)
-        except Exception as e:
-            print(f"Error scraping profile page {profile_link}: {e}")
-            profile_bio = None
+    if person["profile_link"]:
+        profile_bio = fetch_profile_bio(count, name, person["profile_link"])
 
     # --- Scrape external website for research/bio text ---
     website_text = None
-    if website:
-        try:
-            print(f"Scraping website {count}: {name} - {website}...")
-            website_response = requests.get(website, timeout=10)
-            website_soup = BeautifulSoup(website_response.text, "html.parser")
-
-            # Extract text from the specific div with class "field-item even"
-            field_item = website_soup.find("div", class_="field-item even")
-            if field_item:
-                website_text = field_item.get_text(separator=" ", strip=True)
-            else:
-                # Fallback: try just "field-item" or "field-items"
-                field_item = website_soup.find("div", class_="field-item")
-                if field_item:
-                    website_text = field_item.get_text(separator=" ", strip=True)
-
-            # Optional: be respectful with rate limiting
-            time.sleep(0.5)
-        except Exception as e:
-            print(f"Error scraping {website}: {e}")
-            website_text = None
+    if person["website"]:
+        website_text = fetch_website_text(count, name, person["website"])
     else:
         print(f"No website found for {name}")
 
-    faculty_data.append({
-        "name": name,
-        "profile_link": profile_link,
-        "title": title,
-        "office": office,
-        "email": email,
-        "phones": phones,
-        "website": website,
-        "image_url": image_url,
-        "field_of_study": field_of_study,
+    return {
+        **person,
         "profile_bio": profile_bio,
         "website_text": website_text
-    })
+    }
+
+
+def main(workers=WORKERS):
+    response = cached_get(session, URL, cache, timeout=TIMEOUT)
+    with scraper_trace.phase(URL, "parse"):
+        soup = make_soup(response.text, PEOPLE_ONLY)
+    with scraper_trace.phase(URL, "extract"):
+        people = parse_people(soup)
+
+    # map() keeps the listing order no matter which fetches finish first
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        faculty_data = list(pool.map(enrich, range(1, len(people) + 1), people))
+
+    # Save to JSON file
+    with open(OUTPUT_FILE, "w", encoding="utf-8") as json_file:
+        json.dump(faculty_data, json_file, indent=2, ensure_ascii=False)
+
+    print(f"\nData saved to {OUTPUT_FILE}")
+    print(f"Total faculty members scraped: {len(faculty_data)}")
 
-# Save to JSON file
-with open("faculty_data.json", "w", encoding="utf-8") as json_file:
-    json.dump(faculty_data, json_file, indent=2, ensure_ascii=False)
 
-print(f"\nData saved to faculty_data.json")
-print(f"Total faculty members scraped: {len(faculty_data)}")
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape Yale Physics faculty and their websites.")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="people enriched concurrently")
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SECOND,
+                        help="max requests per second to any one host")
+    args = parser.parse_args()
+    configure_http(max(1, args.workers), args.rate)
+    main(max(1, args.workers))
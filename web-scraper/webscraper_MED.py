@@ -1,10 +1,38 @@
-import requests
-from bs4 import BeautifulSoup
-import time
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
+import os
+import threading
+
+import requests
+
+import scraper_trace
+from scraper_http import (
+    DiskCache, HostHealth, HostRateLimiter, HostUnavailable, SkippedContent, cached_get,
+    make_session, normalize_url,
+)
+from scraper_parse import bounded_text, make_soup
 
 BASE_URL = "https://medicine.yale.edu"
 URL = "https://medicine.yale.edu/about/a-to-z-index/atoz/lab-websites/"
+OUTPUT_FILE = "yale_medicine_labs.json"
+# One finished lab record per line, appended as soon as the lab is done. An
+# interrupted run resumes from it; it is removed once a run completes.
+CHECKPOINT_FILE = "yale_medicine_labs.jsonl"
+WORKERS = 8
+# (connect, read): a dead lab host fails on connect instead of the read timeout
+TIMEOUT = (5, 10)
+
+# The only parts of each page the extractors read (see scraper_parse.py)
+INDEX_ONLY = "table"
+LAB_ONLY = "div.wysiwyg, div.field-item, section.research, p, a[href]"
+PUBLICATIONS_ONLY = "li, p"
+
+# Per-page limits for lab sites (see scraper_http.bounded_get)
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+MAX_BIO_CHARS = 20000
+MAX_FALLBACK_CHARS = 5000
 
 headers = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
@@ -13,48 +41,122 @@ headers = {
     "Accept-Language": "en-US,en;q=0.9",
 }
 
-def get_soup(url):
+session = make_session(headers, pool_size=WORKERS)
+limiter = HostRateLimiter(2.0)
+# A host that keeps failing is skipped until its cooldown ends instead of
+# costing a timeout for every page (those labs fail and are retried on the
+# next run); 429/503 slow the host down instead.
+health = HostHealth(max_concurrency=WORKERS)
+cache = DiskCache.from_env()
+
+def configure_http(workers):
+    global session, health
+    session = make_session(headers, pool_size=workers)
+    health = HostHealth(max_concurrency=workers)
+
+def get_html(url):
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = cached_get(session, url, cache, limiter, health=health, timeout=TIMEOUT)
         response.raise_for_status()
-        return BeautifulSoup(response.text, "html.parser")
+        return response.text
+    except (SkippedContent, HostUnavailable) as e:
+        print(f"Skipping {url}: {e}")
+        return None
     except Exception as e:
         print(f"Error fetching {url}: {e}")
         return None
 
-print("Scraping Yale Medicine Lab Directory...")
-soup = get_soup(URL)
-if soup is None:
-    raise RuntimeError("Failed to load A–Z page")
+def get_soup(url, only=None):
+    html = get_html(url)
+    if html is None:
+        return None
+    with scraper_trace.phase(url, "parse"):
+        return make_soup(html, only)
+
+# Per-run LRU of fetched pages keyed by normalized URL, so a lab homepage that
+# is also its own publications page (or is linked with a different trailing
+# slash) is downloaded once.
+PAGE_MEMO_SIZE = 64
+_pages = OrderedDict()
+_pages_lock = threading.Lock()
+
+def get_page_html(url):
+    key = normalize_url(url)
+    with _pages_lock:
+        if key in _pages:
+            _pages.move_to_end(key)
+            return _pages[key]
+    html = fetch_page_html(url)
+    with _pages_lock:
+        _pages[key] = html
+        if len(_pages) > PAGE_MEMO_SIZE:
+            _pages.popitem(last=False)
+    return html
+
+# A lab page, or None when retrying cannot help (a 4xx, a PDF or other
+# non-text response). Network errors, 5xx and a skipped host raise; the
+# caller decides whether that fails the lab (see scrape_lab).
+def fetch_page_html(url):
+    try:
+        response = cached_get(session, url, cache, limiter, MAX_PAGE_BYTES, health=health,
+                              timeout=TIMEOUT)
+    except SkippedContent as e:
+        print(f"Skipping {url}: {e}")
+        return None
+    if 400 <= response.status_code < 500 and response.status_code != 429:
+        print(f"Error fetching {url}: HTTP {response.status_code}")
+        return None
+    response.raise_for_status()
+    return response.text
 
-lab_links = []
+def get_page(url, only=None):
+    html = get_page_html(url)
+    if html is None:
+        return None
+    with scraper_trace.phase(url, "parse"):
+        return make_soup(html, only)
 
 # --- STEP 1: Extract lab links from table rows ---
-# The A-to-Z page has a table with two columns: Lab Name | URL
-table = soup.find("table")
-if not table:
-    print("Warning: no <table> found on the A–Z page. Inspecting HTML…")
-else:
-    for row in table.find_all("tr"):
-        cols = row.find_all("td")
-        # Expect two columns: name and link
-        if len(cols) >= 2:
-            name = cols[0].get_text(strip=True)
-            link_tag = cols[1].find("a", href=True)
-            if link_tag:
-                href = link_tag["href"]
-                # Fix relative path
-                if href.startswith("/"):
-                    href = BASE_URL + href
-                lab_links.append({
-                    "lab_name": name,
-                    "url": href
-                })
-
-print(f"Found {len(lab_links)} labs.")
-
-def find_publications_page(lab_url):
-    soup = get_soup(lab_url)
+def load_lab_links():
+    print("Scraping Yale Medicine Lab Directory...")
+    soup = get_soup(URL, INDEX_ONLY)
+    if soup is None:
+        raise RuntimeError("Failed to load A–Z page")
+
+    with scraper_trace.phase(URL, "extract"):
+        lab_links = parse_lab_links(soup)
+    print(f"Found {len(lab_links)} labs.")
+    return lab_links
+
+def parse_lab_links(soup):
+    lab_links = []
+
+    # The A-to-Z page has a table with two columns: Lab Name | URL
+    table = soup.find("table")
+    if not table:
+        print("Warning: no <table> found on the A–Z page. Inspecting HTML…")
+    else:
+        for row in table.find_all("tr"):
+            cols = row.find_all("td")
+            # Expect two columns: name and link
+            if len(cols) >= 2:
+                name = cols[0].get_text(strip=True)
+                link_tag = cols[1].find("a", href=True)
+                if link_tag:
+                    href = link_tag["href"]
+                    # Fix relative path
+                    if href.startswith("/"):
+                        href = BASE_URL + href
+                    lab_links.append({
+                        "lab_name": name,
+                        "url": href
+                    })
+
+    return lab_links
+
+def find_publications_page(lab_url, soup=None):
+    if soup is None:
+        soup = get_page(lab_url, LAB_ONLY)
     if not soup:
         return None
 
@@ -84,9 +186,21 @@ def scrape_publications(pub_url):
     if not pub_url:
         return None
 
-    soup = get_soup(pub_url)
-    if not soup:
+    try:
+        html = get_page_html(pub_url)
+    except (HostUnavailable, requests.RequestException) as e:
+        # Often on another host; the lab is still saved, without publications.
+        print(f"Error fetching {pub_url}: {e}")
+        return None
+    if html is None:
         return None
+    # parse_publications picks its own parse restriction, so this includes parsing.
+    with scraper_trace.phase(pub_url, "extract"):
+        return parse_publications(html)
+
+
+def parse_publications(html):
+    soup = make_soup(html, PUBLICATIONS_ONLY)
 
     # Try extracting lists (common format)
     list_items = soup.find_all("li")
@@ -102,14 +216,14 @@ def scrape_publications(pub_url):
         if pubs:
             return pubs
 
-    # fallback: general text
-    text = soup.get_text(separator=" ", strip=True)
-    return text[:5000]  # safety cut-off
+    # fallback: general text, which needs the whole document
+    return bounded_text(make_soup(html), MAX_FALLBACK_CHARS)  # safety cut-off
 
 
 # --- STEP 2: Scrape each lab for research bio ---
-def extract_lab_bio(lab_url):
-    soup = get_soup(lab_url)
+def extract_lab_bio(lab_url, soup=None):
+    if soup is None:
+        soup = get_page(lab_url, LAB_ONLY)
     if not soup:
         return None
 
@@ -123,39 +237,140 @@ def extract_lab_bio(lab_url):
     for tag, cls in selectors:
         el = soup.find(tag, class_=cls)
         if el:
-            return el.get_text(separator=" ", strip=True)
+            return bounded_text(el, MAX_BIO_CHARS)
 
     # fallback: join big paragraphs
     ps = soup.find_all("p")
     if len(ps) >= 3:
-        return " ".join(p.get_text(strip=True) for p in ps)
+        texts = []
+        size = 0
+        for p in ps:
+            texts.append(p.get_text(strip=True))
+            size += len(texts[-1]) + 1
+            if size > MAX_BIO_CHARS:
+                break
+        return " ".join(texts)[:MAX_BIO_CHARS]
 
     return None
 
-output = []
-for i, lab in enumerate(lab_links, start=1):
-    print(f"Scraping lab {i}/{len(lab_links)}: {lab['lab_name']} — {lab['url']}")
+def scrape_lab(lab):
+    # One fetch of the lab homepage feeds both extractors; if it fails the
+    # lab raises (see fetch_page_html) and is retried on the next run
+    lab_soup = get_page(lab["url"], LAB_ONLY)
 
-    # research page scrape
-    bio = extract_lab_bio(lab["url"])
+    with scraper_trace.phase(lab["url"], "extract"):
+        # research page scrape
+        bio = extract_lab_bio(lab["url"], lab_soup)
 
-    # publications page scrape
-    pub_page = find_publications_page(lab["url"])
+        # publications page scrape
+        pub_page = find_publications_page(lab["url"], lab_soup)
     publications = scrape_publications(pub_page)
 
-    output.append({
+    return {
         "lab_name": lab["lab_name"],
         "lab_url": lab["url"],
         "research_bio": bio,
         "publications_page": pub_page,
         "publications": publications
-    })
-
-    time.sleep(0.5)
+    }
+
+
+def index_checkpoint(path):
+    """lab_url -> byte offset of its record in the checkpoint file."""
+    offsets = {}
+    if not os.path.exists(path):
+        return offsets
+    with open(path, "rb") as f:
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            try:
+                offsets[json.loads(line)["lab_url"]] = offset
+            except (ValueError, KeyError, TypeError):
+                # A run killed mid-write leaves a torn last line; that lab is redone.
+                continue
+    return offsets
+
+
+def ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def scrape_labs(lab_links, workers=WORKERS, checkpoint=CHECKPOINT_FILE):
+    """Scrape labs not yet in the checkpoint; returns how many failed."""
+    done = index_checkpoint(checkpoint)
+    pending = [lab for lab in lab_links if lab["url"] not in done]
+    if done:
+        print(f"Resuming: {len(lab_links) - len(pending)} labs already in {checkpoint}")
+
+    with open(checkpoint, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        if out.tell() and not ends_with_newline(checkpoint):
+            out.write("\n")  # terminate a torn last line before appending
+        failed = 0
+        futures = {pool.submit(scrape_lab, lab): lab for lab in pending}
+        for i, future in enumerate(as_completed(futures), start=1):
+            lab = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                print(f"Error scraping lab {lab['url']}: {e}")
+                failed += 1
+                continue
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            print(f"Scraped lab {i}/{len(pending)}: {lab['lab_name']} — {lab['url']}")
+    return failed
 
 
 # --- Save to JSON ---
-with open("yale_medicine_labs.json", "w", encoding="utf-8") as f:
-    json.dump(output, f, indent=2, ensure_ascii=False)
-
-print("Saved yale_medicine_labs.json")
+def write_output(lab_links, checkpoint=CHECKPOINT_FILE, output=OUTPUT_FILE):
+    """Rebuild the A–Z ordered JSON array from the checkpoint, one record at a time."""
+    offsets = index_checkpoint(checkpoint)
+    written = 0
+    with open(checkpoint, "rb") as records, open(output, "w", encoding="utf-8") as f:
+        f.write("[")
+        for lab in lab_links:
+            offset = offsets.get(lab["url"])
+            if offset is None:
+                continue
+            records.seek(offset)
+            record = json.loads(records.readline())
+            text = json.dumps(record, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+            f.write(("," if written else "") + "\n  " + text)
+            written += 1
+        f.write("\n]" if written else "]")
+
+    print(f"Saved {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape Yale Medicine lab websites.")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="labs scraped concurrently")
+    parser.add_argument("--restart", action="store_true",
+                        help=f"discard {CHECKPOINT_FILE} instead of resuming from it")
+    args = parser.parse_args()
+
+    if args.restart and os.path.exists(CHECKPOINT_FILE):
+        os.remove(CHECKPOINT_FILE)
+    workers = max(1, args.workers)
+    configure_http(workers)
+    lab_links = load_lab_links()
+    failed = scrape_labs(lab_links, workers)
+    health.print_summary()
+    if failed:
+        # A partial file would drop those labs for whatever imports it.
+        print(f"{failed} labs failed; {OUTPUT_FILE} was left unchanged. "
+              f"Rerun to retry them from {CHECKPOINT_FILE}")
+        return
+    write_output(lab_links)
+    os.remove(CHECKPOINT_FILE)
+
+
+if __name__ == "__main__":
+    main()